@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from bench_crawl import run_crawl
+from mock_fandom import start_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "webapp" / "app"))
+from normalization import normalize_gender, normalize_status  # noqa: E402
+
+# Compare le spider HTML (characters) et le spider API MediaWiki
+# (characters_api) sur le serveur Fandom factice : requêtes, durée, et
+# personnages identiques une fois normalisés (nom, genre, statut).
+# Usage : python benchmarks/bench_api.py --wikis 8 --characters 200 --latency 0.05
+
+
+def key(item):
+    return (
+        item["name"],
+        normalize_gender(item.get("gender")),
+        normalize_status(item.get("status")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML vs API MediaWiki")
+    parser.add_argument("--wikis", type=int, default=8)
+    parser.add_argument("--characters", type=int, default=200, help="personnages par wiki")
+    parser.add_argument("--latency", type=float, default=0.05, help="latence simulée (s)")
+    parser.add_argument("--profile", default="tuned")
+    parser.add_argument("--max-revisions", type=int, default=20,
+                        help="wikitexts par réponse de l'API factice (0 : pas de troncature)")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    server = start_server(n_characters=args.characters, latency=args.latency,
+                          max_revisions=args.max_revisions or None)
+    start_urls = server.start_urls(args.wikis)
+
+    results, items = [], {}
+    for spider in ("characters", "characters_api"):
+        items[spider] = []
+        before = server.requests
+        elapsed, count = run_crawl(start_urls, args.profile, spider=spider, items_out=items[spider])
+        requests = server.requests - before
+        results.append({
+            "spider": spider,
+            "requests": requests,
+            "items": count,
+            "seconds": round(elapsed, 3),
+        })
+        print(f"[BENCH] {spider:>14} : {requests} requêtes, {count} items en {elapsed:.1f}s")
+
+    server.shutdown()
+
+    html = {key(it) for it in items["characters"]}
+    api = {key(it) for it in items["characters_api"]}
+    print(f"[BENCH] personnages identiques : {len(html & api)}/{len(html | api)}")
+    missing = len(html - api)
+    if missing:
+        print(f"[BENCH] {missing} personnages absents du mode API")
+    # Les pages sans infobox n'ont pas d'image en HTML ; l'API la donne (pageimages)
+    for spider, its in items.items():
+        print(f"[BENCH] {spider:>14} : {sum(1 for it in its if it.get('image_url'))} images")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mock_fandom import start_server
+
+# Compare les profils de crawl (CRAWL_PROFILE) sur le serveur Fandom factice.
+# Usage : python benchmarks/bench_crawl.py --wikis 8 --characters 30 --latency 0.05 --shards 1,4
+
+SCRAPY_DIR = Path(__file__).resolve().parents[1] / "scrapy" / "crawler"
+
+
+def run_crawl(start_urls, profile, extra_settings=(), shards=1, spider="characters", items_out=None):
+    # shards > 1 : mêmes arguments que import_characters.run_scrapy, un
+    # process scrapy par shard, lancés en parallèle.
+    # items_out : liste à compléter avec les items lus dans les flux
+    # Stores et télémétrie dans le dossier temporaire (extra_settings peut les
+    # remplacer) : un benchmark ne touche pas aux fichiers du vrai crawl, et
+    # chaque passe part du même état.
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CRAWL_PROFILE=profile)
+        procs, feeds = [], []
+        start = time.perf_counter()
+        for i in range(shards):
+            feed = Path(tmp) / f"characters.shard{i}.jl"
+            cmd = [
+                sys.executable, "-m", "scrapy", "crawl", spider,
+                "-a", "start_urls=" + ",".join(start_urls),
+                "-a", f"shard={i}", "-a", f"shards={shards}",
+                "-O", str(feed),
+                "-s", "LOG_LEVEL=WARNING",
+                "-s", "INCREMENTAL_ENABLED=False",
+                "-s", f"INCREMENTAL_STORE={Path(tmp) / 'pages.sqlite'}",
+                "-s", f"DEDUPE_STORE={Path(tmp) / 'canonical.sqlite'}",
+                "-s", f"TELEMETRY_FILE={Path(tmp) / '.telemetry' / '{spider}.json'}",
+            ]
+            for setting in extra_settings:
+                cmd += ["-s", setting]
+            procs.append(subprocess.Popen(cmd, cwd=str(SCRAPY_DIR), env=env))
+            feeds.append(feed)
+        for proc in procs:
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        elapsed = time.perf_counter() - start
+
+        items = 0
+        for feed in feeds:
+            with open(feed, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    items += 1
+                    if items_out is not None:
+                        items_out.append(json.loads(line))
+    return elapsed, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des profils de crawl")
+    parser.add_argument("--wikis", type=int, default=8)
+    parser.add_argument("--characters", type=int, default=30, help="personnages par wiki")
+    parser.add_argument("--latency", type=float, default=0.05, help="latence simulée (s)")
+    parser.add_argument("--profiles", default="default,tuned")
+    parser.add_argument("--shards", default="1", help="nombres de shards, ex. 1,4")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    server = start_server(n_characters=args.characters, latency=args.latency)
+    start_urls = server.start_urls(args.wikis)
+
+    results = []
+    for profile in args.profiles.split(","):
+        for shards in [int(n) for n in args.shards.split(",")]:
+            before = server.requests
+            elapsed, items = run_crawl(start_urls, profile, shards=shards)
+            pages = server.requests - before
+            result = {
+                "profile": profile,
+                "shards": shards,
+                "wikis": args.wikis,
+                "pages": pages,
+                "items": items,
+                "seconds": round(elapsed, 3),
+                "pages_per_sec": round(pages / elapsed, 2),
+            }
+            results.append(result)
+            print(f"[BENCH] {profile:>8} x{shards} : {pages} pages, {items} items en {elapsed:.1f}s "
+                  f"-> {pages / elapsed:.1f} pages/s")
+
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+from bench_crawl import run_crawl
+from mock_fandom import start_server
+
+# Requêtes évitées par CanonicalDedupeMiddleware, sur un serveur factice avec
+# doublons (?so=search), redirections, listes et pages d'homonymie.
+# Le second crawl réutilise le store d'alias appris au premier.
+# Usage : python benchmarks/bench_dedupe.py --wikis 4 --characters 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la déduplication")
+    parser.add_argument("--wikis", type=int, default=4)
+    parser.add_argument("--characters", type=int, default=60, help="personnages par wiki")
+    parser.add_argument("--profile", default="tuned")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    server = start_server(n_characters=args.characters, latency=0.0, noise=True)
+    start_urls = server.start_urls(args.wikis)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Path(tmp) / "canonical.sqlite"
+        runs = [
+            ("sans dédup", ["DEDUPE_ENABLED=False"]),
+            ("1er crawl", [f"DEDUPE_STORE={store}"]),
+            ("2e crawl", [f"DEDUPE_STORE={store}"]),
+        ]
+        for label, settings in runs:
+            before = server.requests
+            elapsed, items = run_crawl(start_urls, args.profile, settings)
+            pages = server.requests - before
+            results.append({
+                "run": label,
+                "requests": pages,
+                "items": items,
+                "seconds": round(elapsed, 3),
+            })
+            print(f"[BENCH] {label:>10} : {pages} requêtes, {items} items en {elapsed:.1f}s")
+
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
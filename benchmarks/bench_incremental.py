@@ -0,0 +1,98 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_crawl import run_crawl
+from mock_fandom import start_server
+
+# Crawl incrémental (INCREMENTAL_CRAWL=1) sur le serveur Fandom factice :
+# 1. premier crawl, toutes les pages personnage sont extraites ;
+# 2. --edits pages par wiki sont modifiées, en alternant infobox portable et
+#    tableau td/b (une page sur cinq du serveur factice) ;
+# 3. second crawl : seules les pages modifiées doivent être extraites, les
+#    autres répondent 304 ou ont un contenu inchangé.
+# Code de sortie 1 si une page modifiée manque ou si une page inchangée est
+# extraite de nouveau.
+# Usage : python benchmarks/bench_incremental.py --wikis 4 --characters 30
+
+def wiki_name(start_url):
+    # Même nom que le serveur factice (hôte avec des tirets)
+    return start_url.split("//")[1].split(":")[0].replace(".", "-")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du crawl incrémental")
+    parser.add_argument("--wikis", type=int, default=4)
+    parser.add_argument("--characters", type=int, default=30, help="personnages par wiki")
+    parser.add_argument("--edits", type=int, default=2, help="pages modifiées par wiki")
+    parser.add_argument("--latency", type=float, default=0.02, help="latence simulée (s)")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    server = start_server(n_characters=args.characters, latency=args.latency)
+    start_urls = server.start_urls(args.wikis)
+
+    # Pages 0, 4, 5, 9... : infobox et tableau en alternance (variante i % 5 == 4)
+    edited_ids = [i for i in range(args.characters) if i % 5 in (0, 4)][:args.edits]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = [
+            "INCREMENTAL_ENABLED=True",
+            f"INCREMENTAL_STORE={Path(tmp) / 'pages.sqlite'}",
+            f"DEDUPE_STORE={Path(tmp) / 'canonical.sqlite'}",
+            f"TELEMETRY_FILE={Path(tmp) / 'telemetry-{spider}.json'}",
+        ]
+        runs = []
+        expected = set()
+        for run in range(2):
+            if run == 1:
+                for url in start_urls:
+                    wiki = wiki_name(url)
+                    for i in edited_ids:
+                        server.edit(wiki, i)
+                        expected.add(f"Character {i:05d} {wiki}")
+
+            items = []
+            before = server.requests
+            start = time.perf_counter()
+            elapsed, count = run_crawl(start_urls, "tuned", extra_settings=settings, items_out=items)
+            telemetry = json.loads((Path(tmp) / "telemetry-characters.json").read_text(encoding="utf-8"))
+            runs.append({
+                "run": "first" if run == 0 else "second",
+                "pages": server.requests - before,
+                "items": count,
+                "seconds": round(elapsed, 3),
+                "names": sorted(item["name"] for item in items),
+                "telemetry": telemetry["wikis"],
+            })
+            print(f"[BENCH] crawl {run + 1} : {runs[-1]['pages']} pages, {count} items "
+                  f"en {time.perf_counter() - start:.1f}s")
+
+    server.shutdown()
+
+    scraped = set(runs[1]["names"])
+    missing, extra = sorted(expected - scraped), sorted(scraped - expected)
+    for name in missing:
+        print(f"[BENCH] page modifiée non extraite : {name}")
+    for name in extra:
+        print(f"[BENCH] page inchangée extraite de nouveau : {name}")
+    print(f"[BENCH] {len(expected)} pages modifiées, {len(scraped & expected)} extraites au second crawl")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "runs": [{k: v for k, v in r.items() if k != "names"} for r in runs],
+                "edited": len(expected),
+                "missing": missing,
+                "extra": extra,
+            }, f, indent=2)
+
+    if missing or extra:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
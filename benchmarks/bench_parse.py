@@ -0,0 +1,123 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse, Request
+
+# Microbenchmark de parse_character sur les pages HTML de benchmarks/fixtures.
+# Compare l'ancienne extraction (une requête XPath translate() par champ sur
+# tout le document) avec l'extracteur d'infobox en un seul parcours.
+# Usage : python benchmarks/bench_parse.py --repeat 2000
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+sys.path.insert(0, str(ROOT / "scrapy" / "crawler"))
+
+from crawler.infobox import extract_fields  # noqa: E402
+from crawler.spiders.characters_spider import CharactersSpider  # noqa: E402
+
+LOWER = "translate(@data-source, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+
+
+def legacy_fields(response):
+    # Extraction de parse_character avant l'extracteur d'infobox
+    gender_parts = response.xpath(
+        f'//div[contains(@class,"pi-item") and {LOWER}=\'gender\']'
+        '//div[contains(@class,"pi-data-value")]//text()'
+    ).getall()
+    gender = " ".join(g.strip() for g in gender_parts if g.strip())
+    if not gender:
+        gender_td = response.xpath(
+            '//td[b[contains(normalize-space(.),"Gender")]]/following-sibling::td//text()'
+        ).getall()
+        gender = " ".join(g.strip() for g in gender_td if g.strip())
+
+    status = response.xpath(
+        f"normalize-space(string(//div[{LOWER}='status']"
+        "//div[contains(@class,'pi-data-value')]))"
+    ).get()
+    if not status:
+        status_parts = response.xpath(
+            f'//div[contains(@class,"pi-item") and {LOWER}=\'status\']'
+            '//div[contains(@class,"pi-data-value")]//div[contains(@class,"mw-collapsible-content")]//text()'
+        ).getall()
+        status = " ".join(p.strip() for p in status_parts if p.strip())
+    if not status:
+        status_td = response.xpath(
+            '//td[b[contains(normalize-space(.),"Status")]]/following-sibling::td//text()'
+        ).getall()
+        status = " ".join(p.strip() for p in status_td if p.strip())
+
+    image = response.css("figure.pi-item img::attr(src)").get()
+    return {"gender": gender or "Unknown", "status": status or "Unknown", "image": image}
+
+
+def load_fixtures():
+    responses = []
+    for path in sorted(FIXTURES.glob("*.html")):
+        url = f"https://madeinabyss.fandom.com/wiki/{path.stem}"
+        responses.append(HtmlResponse(
+            url=url,
+            body=path.read_bytes(),
+            encoding="utf-8",
+            request=Request(url, meta={"anime": "madeinabyss"}),
+        ))
+    return responses
+
+
+def fresh(response):
+    # Nouvelle réponse : le sélecteur parsel (HTML parsé) est mis en cache sur
+    # la réponse, une copie oblige donc à reparser le document.
+    return response.replace(body=response.body)
+
+
+def bench(fn, responses, repeat, reparse):
+    if not reparse:
+        for response in responses:
+            response.selector
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for response in responses:
+            fn(fresh(response) if reparse else response)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(responses)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de parse_character")
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    spider = CharactersSpider()
+    responses = load_fixtures()
+
+    # Les deux extractions doivent donner les mêmes champs
+    for response in responses:
+        item = next(iter(spider.parse_character(fresh(response))))
+        legacy = legacy_fields(fresh(response))
+        new = {"gender": item["gender"], "status": item["status"], "image": item["image_url"]}
+        if legacy != new:
+            print(f"[BENCH] différence sur {response.url} : {legacy} != {new}")
+
+    results = {}
+    for reparse in (False, True):
+        label = "parsing HTML inclus" if reparse else "extraction seule"
+        before = bench(legacy_fields, responses, args.repeat, reparse)
+        after = bench(extract_fields, responses, args.repeat, reparse)
+        results["with_parse" if reparse else "extract_only"] = {
+            "before_us_per_page": round(before, 1),
+            "after_us_per_page": round(after, 1),
+        }
+        print(f"[BENCH] {label} : avant (XPath translate) {before:.1f} µs/page, "
+              f"après (infobox 1 passe) {after:.1f} µs/page")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
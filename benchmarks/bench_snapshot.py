@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from gen_characters import PRESETS, iter_characters
+
+# Snapshot Arrow (DATA_SOURCE=snapshot) contre la lecture de toute la table
+# par pd.read_sql (l'ancien load_df) :
+# - durée de l'export et taille du fichier ;
+# - ouverture du snapshot mappé contre pd.read_sql, et mémoire résidente
+#   ajoutée au process dans les deux cas ;
+# - requêtes de snapshot.py utilisées par les pages, en médiane sur --repeat.
+# Sans --db, la table est générée dans une base SQLite temporaire ; avec --db,
+# la table characters existante est lue (remplie par exemple par bench_import.py).
+# Usage : python benchmarks/bench_snapshot.py --size 100k
+
+APP_DIR = Path(__file__).resolve().parents[1] / "webapp" / "app"
+
+
+def rss_mb():
+    # Mémoire résidente courante (Linux), None ailleurs
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return None
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 2)
+
+
+def sqlite_engine(path, n):
+    # Même forme que le schéma PostgreSQL (animes + anime_id), genre et statut en texte
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE animes (id INTEGER PRIMARY KEY, slug TEXT UNIQUE, name TEXT, wiki_url TEXT)"))
+        conn.execute(text("""
+            CREATE TABLE characters (
+                id INTEGER PRIMARY KEY, anime_id INTEGER, gender TEXT, status TEXT, name TEXT,
+                character_url TEXT, image_url TEXT, image_path TEXT, search_text TEXT
+            )
+        """))
+        animes, rows = {}, []
+        for item in iter_characters(n):
+            anime_id = animes.setdefault(item["anime"], len(animes) + 1)
+            item["anime_id"] = anime_id
+            item["search_text"] = " ".join(
+                item[k] for k in ("name", "anime", "gender", "status")
+            ).lower()
+            item["image_path"] = None
+            rows.append(item)
+        conn.execute(text("INSERT INTO animes (id, slug, name) VALUES (:id, :slug, :slug)"),
+                     [{"id": i, "slug": slug} for slug, i in animes.items()])
+        conn.execute(text("""
+            INSERT INTO characters (anime_id, gender, status, name, character_url, image_url,
+                                    image_path, search_text)
+            VALUES (:anime_id, :gender, :status, :name, :character_url, :image_url,
+                    :image_path, :search_text)
+        """), rows)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du snapshot Arrow")
+    parser.add_argument("--db", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="base PostgreSQL déjà remplie (sinon SQLite générée)")
+    parser.add_argument("--size", default="100k", help="parmi 10k, 100k, 1m (sans --db)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--search", default="charac 00012")
+    parser.add_argument("--output", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(APP_DIR))
+    import pandas as pd
+    import snapshot
+    from sqlalchemy import create_engine, text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(args.db) if args.db else sqlite_engine(Path(tmp) / "bench.db", PRESETS[args.size])
+        path = Path(tmp) / "characters.arrow"
+
+        start = time.perf_counter()
+        rows = snapshot.export(engine, path)
+        export_seconds = time.perf_counter() - start
+
+        # Ancien chemin : toute la table dans un DataFrame
+        before = rss_mb()
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            df = pd.read_sql(text(snapshot.EXPORT_SQL), conn)
+        read_sql_ms = (time.perf_counter() - start) * 1000
+        read_sql_rss = rss_mb() - before if before is not None else None
+        frame_mb = df.memory_usage(deep=True).sum() / 1e6
+        del df
+        engine.dispose()
+
+        before = rss_mb()
+        start = time.perf_counter()
+        table = snapshot.open_table(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        open_rss = rss_mb() - before if before is not None else None
+
+        cases = {
+            "list_animes": lambda: snapshot.list_animes(table),
+            "count_characters": lambda: snapshot.count_characters(table),
+            "load_page_first": lambda: snapshot.load_page(table, limit=100),
+            "load_page_deep": lambda: snapshot.load_page(table, limit=100, offset=rows // 2),
+            "load_page_search": lambda: snapshot.load_page(table, q=args.search, limit=100),
+            "count_search": lambda: snapshot.count_characters(table, q=args.search),
+            "stats_by_anime": lambda: snapshot.stats_by_anime(table),
+            "stats_by_anime_status": lambda: snapshot.stats_by_anime_and(table, "status", ["Alive", "Deceased"]),
+            "sample_with_images": lambda: snapshot.sample_with_images(table, 24, seed=1),
+        }
+        queries_ms = {name: median_ms(fn, args.repeat) for name, fn in cases.items()}
+
+        results = {
+            "rows": rows,
+            "source": "postgres" if args.db else "sqlite",
+            "export_seconds": round(export_seconds, 3),
+            "file_mb": round(path.stat().st_size / 1e6, 2),
+            "read_sql_ms": round(read_sql_ms, 1),
+            "read_sql_frame_mb": round(frame_mb, 1),
+            "read_sql_rss_mb": round(read_sql_rss, 1) if read_sql_rss is not None else None,
+            "snapshot_open_ms": round(open_ms, 2),
+            "snapshot_open_rss_mb": round(open_rss, 1) if open_rss is not None else None,
+            "queries_ms": queries_ms,
+        }
+        del table
+
+    print(f"[BENCH] {rows} personnages : export {results['export_seconds']}s, "
+          f"{results['file_mb']} Mo sur disque")
+    print(f"[BENCH] pd.read_sql : {results['read_sql_ms']} ms, DataFrame {results['read_sql_frame_mb']} Mo "
+          f"(RSS +{results['read_sql_rss_mb']} Mo)")
+    print(f"[BENCH] snapshot mappé : {results['snapshot_open_ms']} ms (RSS +{results['snapshot_open_rss_mb']} Mo)")
+    for name, ms in queries_ms.items():
+        print(f"[BENCH] {name:>24} : {ms:.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
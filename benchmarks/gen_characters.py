@@ -0,0 +1,85 @@
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Génère un characters.json (ou .jl) synthétique de N personnages, avec les
+# mêmes champs et les mêmes variantes brutes que le spider (genre et statut
+# non normalisés, images manquantes, data: URI), pour les benchmarks d'import
+# et du dashboard.
+# Usage : python benchmarks/gen_characters.py --rows 100000 --output /tmp/characters.json
+
+ANIMES = [
+    "obluda", "nana", "dr stone", "madeinabyss", "dandadan", "kaichouwamaidsama",
+    "ao haru ride", "sayiloveyou", "kiminitodoke", "watashi ga motete dousunda",
+    "bokudakegainaimachi", "violet evergarden", "ansatsukyoshitsu", "fruitsbasket",
+    "detectiveconan", "dragonball", "codegeass", "gintama", "swordartonline",
+    "noragami", "mob psycho 100", "vinlandsaga", "shigatsu wa kimi no uso",
+    "tokyorevengers",
+]
+GENDERS = ["Male", "♂ Male", "Female", "female ♀", "Unknown", "Non-binary", "", "Males"]
+STATUSES = ["Alive", "Deceased", "Unknown", "alive (revived)", "Dead", "Missing", ""]
+
+# Taille des jeux de données standard (--preset)
+PRESETS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def iter_characters(n, seed=0):
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1)
+    for i in range(n):
+        anime = ANIMES[i % len(ANIMES)]
+        host = anime.replace(" ", "-")
+        name = f"Character {i:07d}"
+        r = rng.random()
+        if r < 0.8:
+            image = f"https://static.wikia.nocookie.net/{host}/images/{i % 997}.png"
+        elif r < 0.9:
+            image = "data:image/gif;base64,R0lGODlhAQABAIABAAAAAP///yH5BAEAAAEALAAAAAABAAEAQAICTAEAOw%3D%3D"
+        else:
+            image = None
+        yield {
+            "name": name,
+            "anime": anime,
+            "character_url": f"https://{host}.fandom.com/wiki/{name.replace(' ', '_')}",
+            "gender": rng.choice(GENDERS) or "Unknown",
+            "status": rng.choice(STATUSES) or "Unknown",
+            "image_url": image,
+            "scraped_at": (base + timedelta(seconds=i)).isoformat(),
+        }
+
+
+def write_characters(path, n, seed=0):
+    # Écrit en flux : même 1M de lignes ne passe pas par une liste en mémoire
+    path = Path(path)
+    jsonlines = path.suffix in (".jl", ".jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        if not jsonlines:
+            f.write("[\n")
+        for i, item in enumerate(iter_characters(n, seed)):
+            line = json.dumps(item, ensure_ascii=False)
+            if jsonlines:
+                f.write(line + "\n")
+            else:
+                f.write(("" if i == 0 else ",\n") + line)
+        if not jsonlines:
+            f.write("\n]\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générateur de characters.json")
+    parser.add_argument("--rows", type=int, help="nombre de personnages")
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="10k, 100k ou 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="characters.json", help=".json ou .jl")
+    args = parser.parse_args()
+
+    n = args.rows or PRESETS[args.preset or "10k"]
+    path = write_characters(args.output, n, args.seed)
+    print(f"[GEN] {n} personnages écrits dans {path} ({path.stat().st_size / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
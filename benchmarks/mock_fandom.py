@@ -0,0 +1,384 @@
+import argparse
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Serveur Fandom factice pour les benchmarks hors ligne.
+# Chaque wiki est servi sous un nom d'hôte différent (127.0.0.2, 127.0.0.3, ...)
+# pour que Scrapy le traite comme un domaine/slot distinct, comme les
+# sous-domaines *.fandom.com.
+
+LAST_MODIFIED = "Mon, 09 Feb 2026 15:00:00 GMT"
+
+
+def wiki_hosts(n):
+    return [f"127.0.0.{i + 2}" for i in range(n)]
+
+
+def character_name(wiki, i):
+    return f"Character {i:05d} {wiki}"
+
+
+# -----------------------------
+# Rendu des pages
+# -----------------------------
+def _member_link(href, title):
+    return (f'<li class="category-page__member"><a href="{href}" '
+            f'class="category-page__member-link" title="{title}">{title}</a></li>')
+
+
+def render_category_page(wiki, page, n_characters, per_page, noise=False):
+    # noise : variantes vues sur Fandom, une page sur trois aussi liée avec
+    # ?so=search, une sur cinq par une redirection (Alias_i), plus une liste et
+    # une page d'homonymie par page de catégorie
+    start = page * per_page
+    members = []
+    for i in range(start, min(start + per_page, n_characters)):
+        n = character_name(wiki, i)
+        href = f"/wiki/{n.replace(' ', '_')}"
+        if noise and i % 5 == 0:
+            href = f"/wiki/Alias_{i:05d}"
+        members.append(_member_link(href, n))
+        if noise and i % 3 == 0:
+            members.append(_member_link(f"{href}?so=search", n))
+    if noise:
+        members.append(_member_link(f"/wiki/List_of_{wiki}_characters", f"List of {wiki} characters"))
+        members.append(_member_link(f"/wiki/Character_(disambiguation)_{page}", "Character (disambiguation)"))
+    links = "\n".join(members)
+    next_link = ""
+    if start + per_page < n_characters:
+        next_link = (
+            f'<a href="/wiki/Category:Characters?page={page + 1}" '
+            f'class="category-page__pagination-next wds-button">Next page</a>'
+        )
+    return f"""<!DOCTYPE html>
+<html><head><title>Category:Characters | {wiki} Wiki | Fandom</title></head>
+<body>
+<main class="page__main">
+<h1 class="page-header__title">Category:Characters</h1>
+<div class="category-page__members"><ul class="category-page__members-for-char">
+{links}
+</ul></div>
+<div class="category-page__pagination">{next_link}</div>
+</main>
+</body></html>"""
+
+
+def render_portrait(n, width=268, height=380):
+    # PNG uni généré sans dépendance ; 7 couleurs, donc des portraits partagés
+    # entre personnages (utile pour tester la déduplication par contenu)
+    color = bytes(((n * 37) % 256, (n * 91) % 256, (n * 53) % 256))
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+def character_fields(wiki, i, revision=0):
+    # revision > 0 : page modifiée depuis le premier crawl (MockFandomServer.edit)
+    name = character_name(wiki, i)
+    gender = ["♂ Male", "Female", "female ♀", ""][i % 4]
+    status = ["Alive", "Deceased", "Unknown", "alive (revived)"][(i + revision) % 4]
+    gender_key = ["gender", "Gender", "GENDER"][i % 3]
+    return name, gender, status, gender_key
+
+
+def render_wikitext(wiki, i, revision=0):
+    # Source de la page telle que renvoyée par l'API (prop=revisions), avec
+    # les mêmes variantes que la page HTML
+    name, gender, status, gender_key = character_fields(wiki, i, revision)
+    if i % 5 == 3:
+        status = "{{Collapse|" + status + "}}"
+    if gender:
+        gender = f"[[{gender}]]"
+    infobox = (
+        "{{Character\n"
+        f"|name = {name}\n"
+        f"|image = {i % 7}.png\n"
+        f"|{gender_key} = {gender}\n"
+        f"|Status = {status}<ref>Chapter {i}</ref>\n"
+        f"|age = {15 + i % 30}\n"
+        "}}\n"
+    )
+    return infobox + f"'''{name}''' appears in chapter 1. " + "Lorem ipsum dolor sit amet. " * 20
+
+
+def render_character_page(wiki, i, image_base=None, canonical_base=None, revision=0):
+    # Les variantes reproduisent les différences de structure vues sur Fandom :
+    # casse du data-source, statut replié, tableau td/b sans infobox.
+    name, gender, status, gender_key = character_fields(wiki, i, revision)
+    if image_base is None:
+        image_base = f"https://static.wikia.nocookie.net/{wiki}/images"
+    image = f"{image_base}/{i % 7}.png"
+    variant = i % 5
+
+    if variant == 4:
+        infobox = f"""<table class="infobox">
+<tr><td><b>Gender</b></td><td>{gender}</td></tr>
+<tr><td><b>Status</b></td><td>{status}</td></tr>
+</table>"""
+    else:
+        if variant == 3:
+            status_html = (
+                '<div class="mw-collapsible"><div class="mw-collapsible-content">'
+                f"{status}</div></div>"
+            )
+        else:
+            status_html = status
+        infobox = f"""<aside class="portable-infobox pi-background pi-theme-wikia pi-layout-default">
+<h2 class="pi-item pi-item-spacing pi-title" data-source="name">{name}</h2>
+<figure class="pi-item pi-image" data-source="image">
+<a href="{image}" class="image image-thumbnail">
+<img src="{image}" alt="{name}" width="268" height="380"></a>
+</figure>
+<section class="pi-item pi-group pi-border-color">
+<h2 class="pi-item pi-header pi-secondary-font pi-item-spacing pi-secondary-background">Personal Information</h2>
+<div class="pi-item pi-data pi-item-spacing pi-border-color" data-source="{gender_key}">
+<h3 class="pi-data-label pi-secondary-font">Gender</h3>
+<div class="pi-data-value pi-font">{gender}</div>
+</div>
+<div class="pi-item pi-data pi-item-spacing pi-border-color" data-source="Status">
+<h3 class="pi-data-label pi-secondary-font">Status</h3>
+<div class="pi-data-value pi-font">{status_html}</div>
+</div>
+<div class="pi-item pi-data pi-item-spacing pi-border-color" data-source="age">
+<h3 class="pi-data-label pi-secondary-font">Age</h3>
+<div class="pi-data-value pi-font">{15 + i % 30}</div>
+</div>
+</section>
+</aside>"""
+
+    paragraphs = "\n".join(
+        f"<p>{name} appears in chapter {c}. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>"
+        for c in range(8)
+    )
+    canonical = ""
+    if canonical_base:
+        canonical = f'<link rel="canonical" href="{canonical_base}/wiki/{name.replace(" ", "_")}">'
+    return f"""<!DOCTYPE html>
+<html><head><title>{name} | {wiki} Wiki | Fandom</title>{canonical}</head>
+<body>
+<main class="page__main">
+<h1 class="page-header__title" id="firstHeading"><span class="mw-page-title-main">{name}</span></h1>
+<div id="mw-content-text"><div class="mw-parser-output">
+{infobox}
+{paragraphs}
+</div></div>
+</main>
+</body></html>"""
+
+
+# -----------------------------
+# Serveur HTTP
+# -----------------------------
+class MockFandomHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count_request()
+        if server.latency:
+            time.sleep(server.latency)
+
+        host = (self.headers.get("Host") or "localhost").split(":")[0]
+        wiki = host.replace(".", "-")
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+
+        if path == "/robots.txt":
+            return self._send("User-agent: *\nAllow: /\n", "text/plain")
+
+        if path == "/wiki/Category:Characters":
+            page = int(parse_qs(parsed.query).get("page", ["0"])[0])
+            return self._send(render_category_page(
+                wiki, page, server.n_characters, server.per_page, server.noise
+            ))
+
+        base = f"http://{self.headers.get('Host')}"
+        if path.startswith("/wiki/Alias_"):
+            i = int(path.split("_")[1])
+            name = character_name(wiki, i).replace(" ", "_")
+            return self._redirect(f"{base}/wiki/{name}")
+
+        if path.startswith("/wiki/List_of_") or "(disambiguation)" in path:
+            title = path[len("/wiki/"):].replace("_", " ")
+            return self._send(
+                f'<html><body><h1><span class="mw-page-title-main">{title}</span></h1>'
+                f"<ul><li>Character</li></ul></body></html>"
+            )
+
+        if path.startswith("/wiki/Character_"):
+            try:
+                i = int(path.split("_")[1])
+            except (IndexError, ValueError):
+                return self._send("Not found", "text/plain", status=404)
+            return self._send(render_character_page(
+                wiki, i, f"{base}/images", base, server.revisions.get((wiki, i), 0)
+            ))
+
+        if path == "/api.php":
+            data = self._api(wiki, parse_qs(parsed.query), base)
+            return self._send(json.dumps(data), "application/json")
+
+        if path.startswith("/images/"):
+            n = int(path.rsplit("/", 1)[1].split(".")[0])
+            return self._send(render_portrait(n), "image/png")
+
+        return self._send("Not found", "text/plain", status=404)
+
+    def _api(self, wiki, params, base):
+        # Sous-ensemble de l'API MediaWiki utilisé par le spider characters_api
+        server = self.server
+
+        def get(key, default=""):
+            return params.get(key, [default])[0]
+
+        if get("list") == "categorymembers":
+            limit = min(int(get("cmlimit", "10")), 500)
+            start = int(get("cmcontinue", "0"))
+            end = min(start + limit, server.n_characters)
+            members = [{"ns": 0, "title": character_name(wiki, i)} for i in range(start, end)]
+            if server.noise and start == 0:
+                members.append({"ns": 0, "title": f"List of {wiki} characters"})
+            data = {"query": {"categorymembers": members}}
+            if end < server.n_characters:
+                data["continue"] = {"cmcontinue": str(end), "continue": "-||"}
+            return data
+
+        # Comme l'API réelle quand les wikitexts dépassent la taille maximale
+        # d'une réponse : au plus server.max_revisions pages reçoivent leur
+        # revisions, les suivantes sont servies par rvcontinue (ici la
+        # position du titre). pageimages et info ne sont complets qu'au
+        # premier appel, les suites n'en renvoient plus.
+        titles = get("titles").split("|")[:50]
+        first = not get("rvcontinue")
+        start = int(get("rvcontinue", "0|0").split("|")[0])
+        end = len(titles) if server.max_revisions is None else start + server.max_revisions
+        pages = []
+        for pos, title in enumerate(titles):
+            try:
+                i = int(title.split(" ")[1])
+            except (IndexError, ValueError):
+                pages.append({"title": title, "missing": True})
+                continue
+            page = {"pageid": i + 1, "ns": 0, "title": title}
+            if first:
+                page["fullurl"] = f"{base}/wiki/{title.replace(' ', '_')}"
+                page["original"] = {"source": f"{base}/images/{i % 7}.png", "width": 268, "height": 380}
+            if start <= pos < end:
+                page["revisions"] = [{"slots": {"main": {
+                    "contentmodel": "wikitext",
+                    "content": render_wikitext(wiki, i, server.revisions.get((wiki, i), 0)),
+                }}}]
+            pages.append(page)
+        if end < len(titles):
+            return {"continue": {"rvcontinue": f"{end}|0", "continue": "||"}, "query": {"pages": pages}}
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+    def _redirect(self, location):
+        self.send_response(301)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, body, content_type="text/html", status=200):
+        data = body if isinstance(body, bytes) else body.encode("utf-8")
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockFandomServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, n_characters=50, per_page=20, latency=0.0, noise=False,
+                 max_revisions=None):
+        super().__init__(address, MockFandomHandler)
+        self.n_characters = n_characters
+        self.per_page = per_page
+        self.latency = latency
+        self.noise = noise
+        self.max_revisions = max_revisions
+        self.requests = 0
+        self.revisions = {}
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def edit(self, wiki, i):
+        # Nouvelle révision de la page : le statut change, donc l'ETag aussi
+        with self._lock:
+            self.revisions[(wiki, i)] = self.revisions.get((wiki, i), 0) + 1
+
+    def start_urls(self, n_wikis):
+        port = self.server_address[1]
+        return [f"http://{host}:{port}/wiki/Category:Characters" for host in wiki_hosts(n_wikis)]
+
+
+def start_server(port=0, **kwargs):
+    # Écoute sur toutes les adresses 127.0.0.x (loopback Linux)
+    server = MockFandomServer(("", port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Fandom factice")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--characters", type=int, default=50, help="personnages par wiki")
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="latence par requête (s)")
+    parser.add_argument("--wikis", type=int, default=4)
+    parser.add_argument("--noise", action="store_true",
+                        help="doublons, redirections, listes et pages d'homonymie")
+    parser.add_argument("--max-revisions", type=int,
+                        help="wikitexts par réponse de l'API (suite par rvcontinue)")
+    args = parser.parse_args()
+
+    server = MockFandomServer(
+        ("", args.port),
+        n_characters=args.characters,
+        per_page=args.per_page,
+        latency=args.latency,
+        noise=args.noise,
+        max_revisions=args.max_revisions,
+    )
+    for url in server.start_urls(args.wikis):
+        print(url)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
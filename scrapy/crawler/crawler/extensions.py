@@ -0,0 +1,360 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+# Bornes (s) de l'histogramme de latence, comme les buckets Prometheus
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Champs dont on suit la part de valeurs "Unknown" (extraction ratée)
+QUALITY_FIELDS = ("gender", "status")
+
+
+# Réponses remplacées par une nouvelle requête (RedirectMiddleware)
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class WikiStats:
+    # Compteurs d'un wiki (un sous-domaine).
+    # downloaded : réponses reçues du serveur (signal response_downloaded, sous
+    # les middlewares), responses : celles qui arrivent au spider. L'écart
+    # correspond aux réponses écartées par un middleware : 304 et contenu
+    # inchangé (crawl incrémental), redirections, codes retentés (retry).
+
+    def __init__(self, retry_codes=()):
+        self.retry_codes = tuple(retry_codes)
+        self.requests = 0
+        self.downloaded = {}
+        self.responses = {}
+        self.retries = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.items = 0
+        self.unknown = dict.fromkeys(QUALITY_FIELDS, 0)
+        self.no_image = 0
+        self.first_seen = None
+        self.last_item = None
+
+    def observe_latency(self, seconds):
+        self.latency_sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def latency_quantile(self, q):
+        # Borne haute du bucket qui contient le quantile q
+        total = sum(self.buckets)
+        if not total:
+            return None
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), self.buckets):
+            seen += n
+            if seen >= q * total:
+                return bound
+        return None
+
+    def _discarded(self, codes):
+        # Réponses de ces codes reçues du serveur mais pas passées au spider
+        return sum(max(self.downloaded.get(c, 0) - self.responses.get(c, 0), 0) for c in codes)
+
+    @property
+    def failures(self):
+        # Requêtes parties sans réponse du serveur : connexion refusée, timeout, DNS
+        return max(self.requests - sum(self.downloaded.values()), 0)
+
+    def to_dict(self):
+        duration = (self.last_item or 0) - (self.first_seen or 0)
+        downloaded = sum(self.downloaded.values())
+        not_modified = self._discarded((304,))
+        redirects = self._discarded(REDIRECT_CODES)
+        retried = self._discarded(self.retry_codes)
+        return {
+            "requests": self.requests,
+            "downloaded": downloaded,
+            "responses": sum(self.responses.values()),
+            "status": {str(k): v for k, v in sorted(self.responses.items())},
+            # 4xx/5xx des réponses finales : un code retenté puis réussi n'y est pas
+            "errors_4xx": sum(n for s, n in self.responses.items() if 400 <= s < 500),
+            "errors_5xx": sum(n for s, n in self.responses.items() if s >= 500),
+            "failures": self.failures,
+            "not_modified": not_modified,
+            "redirects": redirects,
+            "retried_responses": retried,
+            # Écartées par un autre middleware, surtout le contenu inchangé
+            "ignored": max(downloaded - sum(self.responses.values()) - not_modified - redirects - retried, 0),
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+            "latency": {
+                "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+                "mean": round(self.latency_sum / downloaded, 4) if downloaded else None,
+                "p50_le": self.latency_quantile(0.5),
+                "p95_le": self.latency_quantile(0.95),
+            },
+            "items": self.items,
+            "items_per_sec": round(self.items / duration, 2) if duration > 0 else None,
+            "unknown_fraction": {
+                f: round(n / self.items, 3) if self.items else None
+                for f, n in self.unknown.items()
+            },
+            "no_image_fraction": round(self.no_image / self.items, 3) if self.items else None,
+        }
+
+
+class CrawlTelemetry:
+    # Extension Scrapy : latence, volume, débit, erreurs et qualité
+    # d'extraction par wiki. Les stats sont écrites en JSON (TELEMETRY_FILE)
+    # toutes les TELEMETRY_INTERVAL secondes et à la fin du crawl, et en
+    # format texte Prometheus si TELEMETRY_PROM_FILE est donné.
+    # TELEMETRY_PORT sert aussi /metrics (Prometheus) et /stats.json en direct.
+
+    def __init__(self, settings):
+        self.name = settings.get("TELEMETRY_NAME")
+        self.path = settings.get("TELEMETRY_FILE")
+        self.prom_path = settings.get("TELEMETRY_PROM_FILE")
+        self.interval = settings.getfloat("TELEMETRY_INTERVAL", 30)
+        self.port = settings.getint("TELEMETRY_PORT", 0)
+        self.retry_codes = [int(c) for c in settings.getlist("RETRY_HTTP_CODES")]
+        self.wikis = {}
+        self.lock = threading.Lock()
+        self.spider_name = None
+        self.loop = None
+        self.server = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("TELEMETRY_ENABLED"):
+            raise NotConfigured
+        ext = cls(crawler.settings)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(ext.request_dropped, signal=signals.request_dropped)
+        crawler.signals.connect(ext.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        return ext
+
+    def _wiki(self, url):
+        host = urlparse(url).hostname or "?"
+        wiki = self.wikis.get(host)
+        if wiki is None:
+            wiki = self.wikis[host] = WikiStats(self.retry_codes)
+            wiki.first_seen = time.monotonic()
+        return wiki
+
+    # -----------------------------
+    # Signaux
+    # -----------------------------
+    def spider_opened(self, spider):
+        # Un fichier par shard (crawl parallèle de run_scrapy) ou par wiki
+        # (TELEMETRY_NAME, mode worker)
+        shard = getattr(spider, "shard", None)
+        if self.name:
+            self.spider_name = self.name
+        else:
+            self.spider_name = spider.name if shard is None else f"{spider.name}-{shard}"
+        if self.path:
+            self.path = self.path.format(spider=self.spider_name)
+        if self.prom_path:
+            self.prom_path = self.prom_path.format(spider=self.spider_name)
+
+        if self.interval > 0:
+            self.loop = task.LoopingCall(self.export)
+            self.loop.start(self.interval, now=False)
+        if self.port:
+            self.server = _serve(self, self.port)
+            spider.logger.info("Télémétrie : http://0.0.0.0:%d/metrics", self.port)
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.export()
+        self.log_summary(spider)
+        if self.server is not None:
+            self.server.shutdown()
+
+    def request_reached_downloader(self, request, spider):
+        with self.lock:
+            wiki = self._wiki(request.url)
+            wiki.requests += 1
+            if request.meta.get("retry_times"):
+                wiki.retries += 1
+
+    def request_dropped(self, request, spider):
+        # Refusée par le scheduler (doublon) : jamais envoyée
+        with self.lock:
+            self._wiki(request.url).dropped += 1
+
+    def response_downloaded(self, response, request, spider):
+        # Toute réponse du serveur, y compris celles qu'un middleware écarte
+        # ensuite (304, contenu inchangé, retry, redirection)
+        with self.lock:
+            wiki = self._wiki(request.url)
+            wiki.downloaded[response.status] = wiki.downloaded.get(response.status, 0) + 1
+            wiki.bytes += len(response.body)
+            latency = request.meta.get("download_latency")
+            if latency is not None:
+                wiki.observe_latency(latency)
+
+    def response_received(self, response, request, spider):
+        with self.lock:
+            wiki = self._wiki(request.url)
+            wiki.responses[response.status] = wiki.responses.get(response.status, 0) + 1
+
+    def item_scraped(self, item, response, spider):
+        adapter = ItemAdapter(item)
+        with self.lock:
+            wiki = self._wiki(response.url)
+            wiki.items += 1
+            wiki.last_item = time.monotonic()
+            for field in QUALITY_FIELDS:
+                if (adapter.get(field) or "Unknown") == "Unknown":
+                    wiki.unknown[field] += 1
+            if not str(adapter.get("image_url") or "").startswith("http"):
+                wiki.no_image += 1
+
+    # -----------------------------
+    # Export
+    # -----------------------------
+    def snapshot(self):
+        with self.lock:
+            return {
+                "spider": self.spider_name,
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "wikis": {host: w.to_dict() for host, w in sorted(self.wikis.items())},
+            }
+
+    def prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            wikis = sorted(self.wikis.items())
+
+            metric("crawl_request_latency_seconds", "histogram", "Latence de téléchargement")
+            for host, w in wikis:
+                total = 0
+                for bound, n in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], w.buckets):
+                    total += n
+                    lines.append(f'crawl_request_latency_seconds_bucket{{wiki="{host}",le="{bound}"}} {total}')
+                lines.append(f'crawl_request_latency_seconds_sum{{wiki="{host}"}} {w.latency_sum:.6f}')
+                lines.append(f'crawl_request_latency_seconds_count{{wiki="{host}"}} {total}')
+
+            metric("crawl_requests_total", "counter", "Requêtes envoyées")
+            for host, w in wikis:
+                lines.append(f'crawl_requests_total{{wiki="{host}"}} {w.requests}')
+
+            metric("crawl_responses_total", "counter", "Réponses par code HTTP")
+            for host, w in wikis:
+                for status, n in sorted(w.responses.items()):
+                    lines.append(f'crawl_responses_total{{wiki="{host}",status="{status}"}} {n}')
+
+            metric("crawl_downloads_total", "counter", "Réponses du serveur par code HTTP, avant les middlewares")
+            for host, w in wikis:
+                for status, n in sorted(w.downloaded.items()):
+                    lines.append(f'crawl_downloads_total{{wiki="{host}",status="{status}"}} {n}')
+
+            metric("crawl_failures_total", "counter", "Requêtes sans réponse (connexion, timeout)")
+            for host, w in wikis:
+                lines.append(f'crawl_failures_total{{wiki="{host}"}} {w.failures}')
+
+            metric("crawl_retries_total", "counter", "Requêtes renvoyées par RetryMiddleware")
+            for host, w in wikis:
+                lines.append(f'crawl_retries_total{{wiki="{host}"}} {w.retries}')
+
+            metric("crawl_dropped_total", "counter", "Requêtes refusées par le scheduler (doublons)")
+            for host, w in wikis:
+                lines.append(f'crawl_dropped_total{{wiki="{host}"}} {w.dropped}')
+
+            metric("crawl_response_bytes_total", "counter", "Octets téléchargés")
+            for host, w in wikis:
+                lines.append(f'crawl_response_bytes_total{{wiki="{host}"}} {w.bytes}')
+
+            metric("crawl_items_total", "counter", "Personnages extraits")
+            for host, w in wikis:
+                lines.append(f'crawl_items_total{{wiki="{host}"}} {w.items}')
+
+            metric("crawl_items_unknown_total", "counter", "Personnages avec un champ Unknown")
+            for host, w in wikis:
+                for field, n in w.unknown.items():
+                    lines.append(f'crawl_items_unknown_total{{wiki="{host}",field="{field}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        if self.path:
+            _write(self.path, json.dumps(self.snapshot(), indent=2))
+        if self.prom_path:
+            _write(self.prom_path, self.prometheus())
+
+    def log_summary(self, spider):
+        for host, stats in self.snapshot()["wikis"].items():
+            unknown = stats["unknown_fraction"]
+            spider.logger.info(
+                "[TELEMETRY] %s : %d requêtes, %d réponses (%d 4xx, %d 5xx, %d sans réponse, "
+                "%d retries), %d non modifiées (304), %d inchangées, %.1f Mo, p95 <= %ss, "
+                "%d items (%s/s), Unknown genre %s statut %s",
+                host, stats["requests"], stats["responses"], stats["errors_4xx"],
+                stats["errors_5xx"], stats["failures"], stats["retries"], stats["not_modified"],
+                stats["ignored"], stats["bytes"] / 1e6, stats["latency"]["p95_le"],
+                stats["items"], stats["items_per_sec"], unknown["gender"], unknown["status"],
+            )
+            # Wiki bloqué (ce que test_categories vérifiait à la main) : la
+            # moitié des requêtes au moins en erreur ou sans réponse. Les 304,
+            # pages inchangées et codes retentés avec succès n'en sont pas.
+            errors = stats["errors_4xx"] + stats["errors_5xx"] + stats["failures"]
+            if stats["requests"] and errors >= stats["requests"] / 2:
+                spider.logger.warning("[TELEMETRY] %s semble bloqué ou en erreur.", host)
+
+
+def _write(path, content):
+    # Écriture atomique : un lecteur ne voit jamais un fichier à moitié écrit.
+    # Fichier temporaire unique : deux process peuvent écrire en même temps.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _serve(telemetry, port):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, kind = telemetry.prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/stats.json":
+                body, kind = json.dumps(telemetry.snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,179 @@
+# Extraction des champs d'une page personnage Fandom en un seul parcours.
+#
+# L'infobox portable (aside.portable-infobox) est parcourue une fois pour
+# construire un dict data-source (en minuscules) -> valeur. Les pages sans
+# infobox utilisent un tableau <td><b>Label</b></td><td>valeur</td>, lu de la
+# même façon. Les champs sont ensuite servis depuis ces dicts, sans
+# relancer de requête XPath sur tout le document.
+
+import re
+
+
+def _text(node):
+    return " ".join(t.strip() for t in node.itertext() if t.strip())
+
+
+def _has_class(node, name):
+    return name in (node.get("class") or "").split()
+
+
+def _in_figure(node, stop):
+    parent = node.getparent()
+    while parent is not None and parent is not stop:
+        if parent.tag == "figure" and _has_class(parent, "pi-item"):
+            return True
+        parent = parent.getparent()
+    return False
+
+
+def extract_infobox(selector):
+    fields = {}
+    for aside in selector.root.iter("aside"):
+        if not _has_class(aside, "portable-infobox"):
+            continue
+
+        # Parcours en ordre du document : la valeur (div.pi-data-value) suit
+        # toujours l'élément qui porte le data-source.
+        key = None
+        for node in aside.iter():
+            tag = node.tag
+            if not isinstance(tag, str):
+                continue
+
+            # Image principale : première image d'une figure.pi-item
+            if tag == "img":
+                if "image" not in fields and node.get("src") and _in_figure(node, aside):
+                    fields["image"] = node.get("src")
+                continue
+
+            source = node.get("data-source")
+            if source:
+                key = source.strip().lower()
+                continue
+
+            if key and key not in fields and "pi-data-value" in (node.get("class") or ""):
+                value = _text(node)
+                if value:
+                    fields[key] = value
+                key = None
+    return fields
+
+
+def extract_table(selector):
+    # Fallback <td><b>Gender</b></td><td>...</td> : label en minuscules -> valeur
+    fields = {}
+    for td in selector.root.iter("td"):
+        label = td.find("b")
+        if label is None:
+            continue
+        key = _text(label).rstrip(":").strip().lower()
+        if not key or key in fields:
+            continue
+        value = " ".join(_text(sib) for sib in td.itersiblings("td"))
+        if value.strip():
+            fields[key] = value.strip()
+    return fields
+
+
+def extract_fields(response, keys=("gender", "status", "image")):
+    selector = response.selector
+    fields = extract_infobox(selector)
+
+    # Le tableau n'est parcouru que s'il manque un champ dans l'infobox
+    missing = [k for k in keys if not fields.get(k)]
+    if missing:
+        for label, value in extract_table(selector).items():
+            for k in missing:
+                if not fields.get(k) and k in label:
+                    fields[k] = value
+    return fields
+
+
+# -----------------------------
+# Wikitext (spider characters_api)
+# -----------------------------
+# Avec l'API MediaWiki on reçoit le wikitext de la page au lieu du HTML :
+# l'infobox est un modèle {{Character | gender = ... | status = ... }}.
+# Ses paramètres sont lus en un parcours, en tenant compte des modèles et
+# liens imbriqués, puis nettoyés du balisage.
+
+WIKI_LINK = re.compile(r"\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]")
+WIKI_MARKUP = re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>|<!--.*?-->|'{2,}", re.S)
+HTML_TAG = re.compile(r"<[^>]+>")
+
+
+def _top_level_templates(wikitext):
+    # Contenu de chaque {{...}} de premier niveau
+    depth, start = 0, None
+    i = 0
+    while i < len(wikitext) - 1:
+        pair = wikitext[i:i + 2]
+        if pair == "{{":
+            if depth == 0:
+                start = i + 2
+            depth += 1
+            i += 2
+        elif pair == "}}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield wikitext[start:i]
+            i += 2
+        else:
+            i += 1
+
+
+def _split_params(body):
+    # Découpe sur les | qui ne sont pas dans un modèle ou un lien imbriqué
+    parts, depth, current = [], 0, []
+    i = 0
+    while i < len(body):
+        pair = body[i:i + 2]
+        if pair in ("{{", "[["):
+            depth += 1
+            current.append(pair)
+            i += 2
+        elif pair in ("}}", "]]") and depth:
+            depth -= 1
+            current.append(pair)
+            i += 2
+        elif body[i] == "|" and depth == 0:
+            parts.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(body[i])
+            i += 1
+    parts.append("".join(current))
+    return parts
+
+
+def clean_wikitext(value):
+    value = WIKI_MARKUP.sub("", value)
+    value = WIKI_LINK.sub(r"\1", value)
+    # Modèles restants ({{Male}}, {{Ruby|...}}) : on garde le dernier argument
+    while "{{" in value:
+        inner = re.sub(r"\{\{([^{}]*)\}\}", lambda m: m.group(1).split("|")[-1], value)
+        if inner == value:
+            break
+        value = inner
+    value = HTML_TAG.sub(" ", value)
+    return " ".join(value.split())
+
+
+def extract_wikitext(wikitext, keys=("gender", "status")):
+    # Paramètres (clés en minuscules) du premier modèle qui contient l'un des
+    # champs recherchés
+    for body in _top_level_templates(wikitext or ""):
+        fields = {}
+        for part in _split_params(body)[1:]:
+            key, sep, value = part.partition("=")
+            if not sep:
+                continue
+            key = key.strip().lower()
+            if key and key not in fields:
+                value = clean_wikitext(value)
+                if value:
+                    fields[key] = value
+        if any(k in fields for k in keys):
+            return fields
+    return {}
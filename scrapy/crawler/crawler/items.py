@@ -8,4 +8,5 @@ class CharacterItem(scrapy.Item):
     gender = scrapy.Field()
     status = scrapy.Field()
     image_url = scrapy.Field()
+    image_path = scrapy.Field()
     scraped_at = scrapy.Field()
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+from itemadapter import ItemAdapter, is_item
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+from crawler.infobox import extract_fields
+from crawler.urls import canonical_url, canonicalize_url, is_character_title, page_title
+
+
+PAGES_SQL = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT
+    )
+"""
+
+# Pages extraites par un crawl lancé par import_characters, en attente de
+# leur import (une ligne par page et par lot, voir commit_pending)
+PENDING_SQL = """
+    CREATE TABLE IF NOT EXISTS pending (
+        batch TEXT NOT NULL,
+        url TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        PRIMARY KEY (batch, url)
+    )
+"""
+
+
+def _connect(store_path):
+    # Le store peut être partagé par plusieurs process (crawl en shards) :
+    # WAL et une écriture par transaction pour ne pas bloquer les autres
+    db = sqlite3.connect(str(store_path), timeout=30, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(PAGES_SQL)
+    db.execute(PENDING_SQL)
+    return db
+
+
+def commit_pending(store_path, batch):
+    # Appelée par import_characters une fois les items du lot en base :
+    # les pages du lot deviennent connues du crawl suivant
+    if not Path(store_path).exists():
+        return 0
+    db = _connect(store_path)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        count = db.execute("""
+            INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash)
+            SELECT url, etag, last_modified, content_hash FROM pending WHERE batch = ?
+        """, (batch,)).rowcount
+        db.execute("DELETE FROM pending WHERE batch = ?", (batch,))
+        db.execute("COMMIT")
+        return count
+    finally:
+        db.close()
+
+
+class IncrementalCrawlMiddleware:
+    # Crawl incrémental : pour chaque page personnage on garde l'ETag, le
+    # Last-Modified et un hash du contenu. Les requêtes suivantes sont
+    # conditionnelles et les pages inchangées ne passent pas par parse_character.
+    # Le hash d'une page modifiée n'est enregistré qu'une fois son item sorti
+    # des pipelines (item_scraped), et seulement si le crawl se termine sans
+    # erreur d'écriture : sinon la page serait vue comme inchangée au crawl
+    # suivant sans jamais avoir été importée.
+    # Avec INCREMENTAL_PENDING (lots lancés par import_characters), ces pages
+    # restent dans la table pending jusqu'à l'import du flux (commit_pending).
+
+    def __init__(self, store_path, stats, batch=None):
+        self.store_path = Path(store_path)
+        self.stats = stats
+        self.batch = batch
+        self.db = None
+        # url -> (etag, last_modified, hash) des pages modifiées, puis de
+        # celles dont l'item est passé
+        self.staged = {}
+        self.scraped = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            crawler.settings.get("INCREMENTAL_STORE"),
+            crawler.stats,
+            crawler.settings.get("INCREMENTAL_PENDING"),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        return s
+
+    def spider_opened(self, spider):
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = _connect(self.store_path)
+        if self.batch:
+            # Reste d'un lot dont l'import a échoué : ses pages sont relues
+            self.db.execute("DELETE FROM pending WHERE batch = ?", (self.batch,))
+        spider.logger.info("Crawl incrémental, store : %s", self.store_path)
+
+    def item_scraped(self, item, response, spider):
+        row = self.staged.pop(response.url, None)
+        if row is not None:
+            self.scraped.append((response.url,) + row)
+
+    def spider_closed(self, spider, reason):
+        if self.db is None:
+            return
+        errors = self.stats.get_value("db/errors", 0, spider=spider)
+        if reason != "finished" or errors:
+            spider.logger.warning(
+                "Crawl incrémental : store non mis à jour (fin : %s, %d erreurs d'écriture), "
+                "%d pages seront relues", reason, errors, len(self.scraped),
+            )
+        elif self.batch:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO pending (batch, url, etag, last_modified, content_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.batch,) + row for row in self.scraped],
+            )
+        else:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash) "
+                "VALUES (?, ?, ?, ?)",
+                self.scraped,
+            )
+        self.db.close()
+
+    def process_request(self, request, spider):
+        # Seules les pages personnage sont concernées, les pages de catégorie
+        # doivent toujours être relues pour découvrir les nouveaux liens.
+        if not request.meta.get("incremental"):
+            return None
+
+        row = self.db.execute(
+            "SELECT etag, last_modified FROM pages WHERE url = ?", (request.url,)
+        ).fetchone()
+        if row:
+            etag, last_modified = row
+            if etag:
+                request.headers.setdefault("If-None-Match", etag)
+            if last_modified:
+                request.headers.setdefault("If-Modified-Since", last_modified)
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get("incremental"):
+            return response
+
+        if response.status == 304:
+            self.stats.inc_value("incremental/not_modified", spider=spider)
+            raise IgnoreRequest(f"Page non modifiée (304) : {request.url}")
+
+        if response.status != 200:
+            return response
+
+        content_hash = self.content_hash(response)
+        etag = self._header(response, b"ETag")
+        last_modified = self._header(response, b"Last-Modified")
+        row = self.db.execute(
+            "SELECT content_hash FROM pages WHERE url = ?", (request.url,)
+        ).fetchone()
+
+        if row and row[0] == content_hash:
+            # Contenu déjà importé : seuls l'ETag et le Last-Modified changent
+            self.db.execute(
+                "UPDATE pages SET etag = ?, last_modified = ? WHERE url = ?",
+                (etag, last_modified, request.url),
+            )
+            self.stats.inc_value("incremental/unchanged", spider=spider)
+            raise IgnoreRequest(f"Contenu inchangé : {request.url}")
+
+        self.staged[request.url] = (etag, last_modified, content_hash)
+        self.stats.inc_value("incremental/changed", spider=spider)
+        return response
+
+    @staticmethod
+    def content_hash(response):
+        # Le reste de la page Fandom (pubs, jetons, compteurs) change à chaque
+        # requête : on ne hash que les champs lus par parse_character (titre,
+        # puis infobox ou tableau td/b via extract_fields).
+        if not hasattr(response, "css"):
+            return hashlib.sha1(response.body).hexdigest()
+        fields = dict(extract_fields(response))
+        fields["name"] = response.css("span.mw-page-title-main::text").get()
+        data = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name)
+        return value.decode("latin-1") if value else None
+
+
+class CanonicalDedupeMiddleware:
+    # Middleware de spider : chaque lien vers une page personnage est mis sous
+    # forme canonique (crawler/urls.py) avant d'être planifié. Les listes et
+    # les pages d'homonymie sont écartées, et une page déjà planifiée pendant
+    # le crawl n'est pas redemandée.
+    # Les alias découverts (redirections, <link rel="canonical">) sont gardés
+    # dans DEDUPE_STORE. Au crawl suivant, un lien vers un alias est remplacé
+    # par la page canonique avant d'être planifié.
+
+    def __init__(self, store_path, stats):
+        self.store_path = Path(store_path)
+        self.stats = stats
+        self.db = None
+        self.seen = set()
+        self.emitted = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("DEDUPE_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler.settings.get("DEDUPE_STORE"), crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        # Même réglage que le store incrémental (partagé entre shards)
+        self.db = sqlite3.connect(str(self.store_path), timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS aliases (
+                url TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL
+            )
+        """)
+
+    def spider_closed(self, spider):
+        saved = sum(
+            self.stats.get_value(f"dedupe/{key}", 0, spider=spider)
+            for key in ("skipped_title", "duplicate", "alias")
+        )
+        self.stats.set_value("dedupe/requests_saved", saved, spider=spider)
+        spider.logger.info("Déduplication : %d requêtes évitées", saved)
+        if self.db is not None:
+            self.db.close()
+
+    def process_spider_input(self, response, spider):
+        # Les URLs par lesquelles on est arrivé sur la page deviennent des
+        # alias de son URL canonique
+        if response.meta.get("character"):
+            canonical = canonical_url(response)
+            urls = response.meta.get("redirect_urls", []) + [response.url]
+            for url in {canonicalize_url(u) for u in urls} - {canonical}:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO aliases (url, canonical) VALUES (?, ?)",
+                    (url, canonical),
+                )
+            self.seen.add(canonical)
+        return None
+
+    def process_spider_output(self, response, result, spider):
+        for x in result:
+            if isinstance(x, Request) and x.meta.get("character"):
+                x = self._filter(x, spider)
+            elif is_item(x):
+                # Deux alias pas encore connus peuvent mener au même personnage
+                url = ItemAdapter(x).get("character_url")
+                if url in self.emitted:
+                    self.stats.inc_value("dedupe/duplicate_items", spider=spider)
+                    x = None
+                self.emitted.add(url)
+            if x is not None:
+                yield x
+
+    def _filter(self, request, spider):
+        if not is_character_title(page_title(request.url)):
+            self.stats.inc_value("dedupe/skipped_title", spider=spider)
+            return None
+
+        url = canonicalize_url(request.url)
+        row = self.db.execute("SELECT canonical FROM aliases WHERE url = ?", (url,)).fetchone()
+        if row:
+            self.stats.inc_value("dedupe/alias", spider=spider)
+            url = row[0]
+
+        if url in self.seen:
+            self.stats.inc_value("dedupe/duplicate", spider=spider)
+            return None
+        self.seen.add(url)
+        return request if url == request.url else request.replace(url=url)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+from itemadapter import ItemAdapter
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+from scrapy.pipelines.images import ImagesPipeline
+from twisted.internet import threads
+from twisted.internet.defer import DeferredLock
+from twisted.python.failure import Failure
+
+# Code de l'import (normalisation, upsert) partagé avec le webapp
+WEBAPP_DIR = Path(os.environ.get(
+    "WEBAPP_DIR", Path(__file__).resolve().parents[3] / "webapp" / "app"
+))
+
+
+class PortraitPipeline(ImagesPipeline):
+    # Télécharge le portrait de chaque personnage pendant le crawl et le range
+    # dans IMAGES_STORE, adressé par le hash de son contenu :
+    #   full/<sha1>.jpg, thumbs/<taille>/<sha1>.jpg (voir IMAGES_THUMBS)
+    # Un portrait partagé par plusieurs pages n'est stocké qu'une fois.
+    # index/<sha1(url)> retient le hash déjà obtenu pour une URL, pour ne pas
+    # la retélécharger au crawl suivant. Le chemin est écrit dans image_path.
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.store_dir = Path(self.store.basedir)
+        (self.store_dir / "index").mkdir(parents=True, exist_ok=True)
+
+    def get_media_requests(self, item, info):
+        url = ItemAdapter(item).get("image_url")
+        # Les data: URI sont des images de chargement différé, pas des portraits
+        if isinstance(url, str) and url.startswith("http"):
+            yield Request(url)
+
+    def _index_path(self, url):
+        return self.store_dir / "index" / hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def media_to_download(self, request, info, *, item=None):
+        index = self._index_path(request.url)
+        if not index.exists():
+            return None
+
+        digest = index.read_text().strip()
+        path = self._full_path(digest)
+        if not (self.store_dir / path).exists():
+            return None
+
+        self.inc_stats(info.spider, "uptodate")
+        return {"url": request.url, "path": path, "checksum": digest, "status": "uptodate"}
+
+    @staticmethod
+    def _digest(response):
+        return hashlib.sha1(response.body).hexdigest()
+
+    @staticmethod
+    def _full_path(digest):
+        return f"full/{digest}.jpg"
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        if response is None:
+            # Hash inconnu avant le téléchargement : chemin par URL, jamais stocké
+            return f"full/url-{hashlib.sha1(request.url.encode('utf-8')).hexdigest()}.jpg"
+        return self._full_path(self._digest(response))
+
+    def thumb_path(self, request, thumb_id, response=None, info=None, *, item=None):
+        return f"thumbs/{thumb_id}/{self._digest(response)}.jpg"
+
+    def file_downloaded(self, response, request, info, *, item=None):
+        digest = self._digest(response)
+        # Contenu déjà stocké (même image sous une autre URL) : rien à réécrire
+        if not (self.store_dir / self._full_path(digest)).exists():
+            super().file_downloaded(response, request, info, item=item)
+        self._index_path(request.url).write_text(digest)
+        return digest
+
+    def item_completed(self, results, item, info):
+        adapter = ItemAdapter(item)
+        paths = [r["path"] for ok, r in results if ok]
+        adapter["image_path"] = paths[0] if paths else None
+        return item
+
+
+class DatabasePipeline:
+    # Écrit les personnages dans PostgreSQL pendant le crawl, sans passer par
+    # le fichier JSON. Les items sont normalisés et upsertés avec le code
+    # d'import_characters (iter_rows, copy_rows), par lots de
+    # DB_PIPELINE_BATCH_SIZE.
+    # Un lot plein est écrit dans un thread. L'item qui l'a rempli n'est rendu
+    # à Scrapy qu'après l'écriture, et les écritures passent une à une
+    # (DeferredLock). Si la base ralentit, le scraper attend et arrête de
+    # prendre de nouvelles réponses : la mémoire reste bornée à quelques lots.
+
+    def __init__(self, db_url, batch_size, stats):
+        self.db_url = db_url
+        self.batch_size = batch_size
+        self.stats = stats
+        self.buffer = []
+        self.lock = DeferredLock()
+        self.changed = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = crawler.settings
+        if not s.get("DB_PIPELINE_URL"):
+            raise NotConfigured("DB_PIPELINE_URL manquant")
+        return cls(s.get("DB_PIPELINE_URL"), s.getint("DB_PIPELINE_BATCH_SIZE", 500), crawler.stats)
+
+    def open_spider(self, spider):
+        if str(WEBAPP_DIR) not in sys.path:
+            sys.path.insert(0, str(WEBAPP_DIR))
+        import import_characters
+        from sqlalchemy import create_engine
+
+        self.importer = import_characters
+        self.engine = create_engine(self.db_url)
+        self.importer.init_db(self.engine)
+        spider.logger.info("Écriture directe dans PostgreSQL, lots de %d", self.batch_size)
+
+    def process_item(self, item, spider):
+        self.buffer.append(ItemAdapter(item).asdict())
+        if len(self.buffer) < self.batch_size:
+            return item
+
+        batch, self.buffer = self.buffer, []
+        d = self.lock.run(threads.deferToThread, self._write, batch)
+        d.addCallback(lambda _: item)
+        return d
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with self.engine.begin() as conn:
+                count, changed = self.importer.copy_rows(conn, self.importer.iter_rows(batch))
+        except Exception:
+            # Lu par IncrementalCrawlMiddleware : les pages du crawl seront relues
+            self.stats.inc_value("db/errors")
+            raise
+        self.stats.inc_value("db/items", count)
+        self.stats.inc_value("db/changed", changed)
+        self.stats.inc_value("db/batches")
+        # Le dashboard voit les nouvelles lignes dès ce lot
+        if changed:
+            self.changed += changed
+            self.importer.bump_data_version(self.engine)
+
+    def _finish(self):
+        try:
+            if self.changed:
+                self.importer.refresh_stats(self.engine)
+                self.importer.export_snapshot(self.engine)
+        finally:
+            self.engine.dispose()
+
+    def close_spider(self, spider):
+        batch, self.buffer = self.buffer, []
+        d = self.lock.run(threads.deferToThread, self._write, batch)
+        # Même si le dernier lot échoue : les lots précédents sont déjà en
+        # base (et la version des données incrémentée), les stats et le
+        # snapshot doivent les suivre. L'échec du lot reste rendu à Scrapy.
+        d.addBoth(self._close, spider)
+        return d
+
+    def _close(self, result, spider):
+        d = threads.deferToThread(self._finish)
+        if isinstance(result, Failure):
+            d.addErrback(lambda f: spider.logger.error("Fin d'import en échec : %s", f.value))
+        d.addCallback(lambda _: result)
+        return d
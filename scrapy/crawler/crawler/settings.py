@@ -1,3 +1,5 @@
+import os
+
 BOT_NAME = "crawler"
 
 SPIDER_MODULES = ["crawler.spiders"]
@@ -5,3 +7,88 @@ NEWSPIDER_MODULE = "crawler.spiders"
 
 ROBOTSTXT_OBEY = True
 DOWNLOAD_DELAY = 1
+
+# Profil de crawl : "default" (délai fixe d'1s) ou "tuned"
+CRAWL_PROFILE = os.environ.get("CRAWL_PROFILE", "default")
+
+if CRAWL_PROFILE == "tuned":
+    # Chaque wiki est un sous-domaine *.fandom.com, donc un slot de
+    # téléchargement distinct : la politesse s'applique par wiki et tous les
+    # wikis peuvent avancer en parallèle (16 requêtes globales < 24 wikis).
+    CONCURRENT_REQUESTS = 64
+    CONCURRENT_REQUESTS_PER_DOMAIN = 4
+    DOWNLOAD_DELAY = 0.25
+
+    # AutoThrottle ajuste le délai de chaque slot pour viser une latence :
+    # délai cible = latence / AUTOTHROTTLE_TARGET_CONCURRENCY
+    AUTOTHROTTLE_ENABLED = True
+    AUTOTHROTTLE_START_DELAY = 0.5
+    AUTOTHROTTLE_MAX_DELAY = 10
+    AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
+
+    DNSCACHE_ENABLED = True
+    DNSCACHE_SIZE = 10000
+    REACTOR_THREADPOOL_MAXSIZE = 20
+
+    # Le handler HTTP/1.1 réutilise déjà les connexions (keep-alive).
+    # HTTP/2 est expérimental dans Scrapy et demande le paquet h2.
+    if os.environ.get("CRAWL_HTTP2", "0") == "1":
+        DOWNLOAD_HANDLERS = {
+            "https": "scrapy.core.downloader.handlers.http2.H2DownloadHandler",
+        }
+
+# Crawl incrémental : requêtes conditionnelles et pages inchangées ignorées
+INCREMENTAL_ENABLED = os.environ.get("INCREMENTAL_CRAWL", "0") == "1"
+INCREMENTAL_STORE = os.environ.get("INCREMENTAL_STORE", ".incremental/pages.sqlite")
+# Nom du lot (passé par import_characters avec -s) : les pages extraites
+# attendent l'import du flux avant d'être marquées comme vues
+INCREMENTAL_PENDING = None
+
+DOWNLOADER_MIDDLEWARES = {
+    "crawler.middlewares.IncrementalCrawlMiddleware": 543,
+}
+
+# URLs canoniques et déduplication des pages personnage avant planification ;
+# le store garde les alias (redirections, rel=canonical) d'un crawl à l'autre
+DEDUPE_ENABLED = os.environ.get("CRAWL_DEDUPE", "1") == "1"
+DEDUPE_STORE = os.environ.get("DEDUPE_STORE", ".incremental/canonical.sqlite")
+
+SPIDER_MIDDLEWARES = {
+    "crawler.middlewares.CanonicalDedupeMiddleware": 543,
+}
+
+# Télémétrie par wiki (crawler/extensions.py) : latence, octets, débit,
+# erreurs et part de genres/statuts "Unknown", en JSON et/ou Prometheus.
+# {spider} est remplacé par le nom du spider (et le numéro de shard), ou par
+# TELEMETRY_NAME s'il est donné (le worker passe le slug du wiki : un fichier
+# par process).
+TELEMETRY_ENABLED = os.environ.get("CRAWL_TELEMETRY", "1") == "1"
+TELEMETRY_NAME = None
+TELEMETRY_FILE = os.environ.get("TELEMETRY_FILE", ".telemetry/{spider}.json")
+TELEMETRY_PROM_FILE = os.environ.get("TELEMETRY_PROM_FILE")
+TELEMETRY_INTERVAL = float(os.environ.get("TELEMETRY_INTERVAL", "30"))
+TELEMETRY_PORT = int(os.environ.get("TELEMETRY_PORT", "0"))
+
+EXTENSIONS = {
+    "crawler.extensions.CrawlTelemetry": 500,
+}
+
+# Portraits téléchargés pendant le crawl (demande Pillow), servis ensuite par
+# le webapp depuis le disque. Les tailles de miniatures suivent les largeurs
+# utilisées par la galerie (webapp/app/images.py).
+ITEM_PIPELINES = {}
+if os.environ.get("DOWNLOAD_PORTRAITS", "0") == "1":
+    ITEM_PIPELINES["crawler.pipelines.PortraitPipeline"] = 1
+    IMAGES_STORE = os.environ.get("PORTRAIT_STORE", "portraits")
+    IMAGES_THUMBS = {
+        "w128": (128, 1024),
+        "w192": (192, 1536),
+        "w256": (256, 2048),
+    }
+
+# Écriture des items dans PostgreSQL pendant le crawl (après les portraits,
+# pour avoir image_path). Le flux JSON devient alors facultatif.
+if os.environ.get("STREAM_TO_DB", "0") == "1":
+    ITEM_PIPELINES["crawler.pipelines.DatabasePipeline"] = 300
+    DB_PIPELINE_URL = os.environ.get("DATABASE_URL")
+    DB_PIPELINE_BATCH_SIZE = int(os.environ.get("DB_PIPELINE_BATCH_SIZE", "500"))
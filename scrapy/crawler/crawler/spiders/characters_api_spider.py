@@ -0,0 +1,136 @@
+import json
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+
+import scrapy
+from crawler.infobox import extract_wikitext
+from crawler.items import CharacterItem
+from crawler.spiders.characters_spider import CharactersSpider
+from crawler.urls import canonicalize_url, is_character_title
+
+
+class CharactersApiSpider(CharactersSpider):
+    # Même résultat que CharactersSpider, via l'API MediaWiki (api.php) de
+    # chaque wiki au lieu des pages HTML :
+    # - list=categorymembers énumère Category:Characters par 500 titres ;
+    # - prop=revisions|pageimages|info renvoie, pour 50 titres par requête, le
+    #   wikitext (infobox), le portrait et l'URL de chaque page. Si les
+    #   wikitexts dépassent la taille maximale d'une réponse, l'API renvoie
+    #   une partie des pages sans revisions et un "continue" : la suite est
+    #   redemandée et fusionnée avant de produire les items.
+    # Usage : scrapy crawl characters_api (mêmes arguments -a que characters)
+    name = "characters_api"
+
+    CATEGORY = "Category:Characters"
+    MEMBERS_LIMIT = 500
+    TITLES_PER_REQUEST = 50
+
+    @staticmethod
+    def api_url(url, **params):
+        parts = urlparse(url)
+        params["format"] = "json"
+        params["formatversion"] = "2"
+        return f"{parts.scheme}://{parts.netloc}/api.php?{urlencode(params)}"
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield self._members_request(url, self.anime_name(url))
+
+    def _members_request(self, wiki_url, anime, cont=None):
+        params = {
+            "action": "query",
+            "list": "categorymembers",
+            "cmtitle": self.CATEGORY,
+            "cmnamespace": "0",
+            "cmlimit": str(self.MEMBERS_LIMIT),
+        }
+        if cont:
+            params["cmcontinue"] = cont
+        return scrapy.Request(
+            self.api_url(wiki_url, **params),
+            callback=self.parse_members,
+            meta={"anime": anime, "wiki_url": wiki_url},
+        )
+
+    def parse_members(self, response):
+        data = json.loads(response.text)
+        anime, wiki_url = response.meta["anime"], response.meta["wiki_url"]
+
+        # Listes et pages d'homonymie écartées avant toute requête
+        titles = [
+            m["title"] for m in data.get("query", {}).get("categorymembers", [])
+            if is_character_title(m["title"])
+        ]
+        for i in range(0, len(titles), self.TITLES_PER_REQUEST):
+            yield self._pages_request(wiki_url, anime, titles[i:i + self.TITLES_PER_REQUEST])
+
+        cont = data.get("continue", {}).get("cmcontinue")
+        if cont:
+            yield self._members_request(wiki_url, anime, cont)
+
+    def _pages_request(self, wiki_url, anime, titles, cont=None, pages=None):
+        # cont : paramètres "continue" de la réponse précédente ; pages : pages
+        # déjà reçues pour ce lot, complétées par chaque suite
+        params = {
+            "action": "query",
+            "prop": "revisions|pageimages|info",
+            "rvprop": "content",
+            "rvslots": "main",
+            "piprop": "original",
+            "pilimit": str(self.TITLES_PER_REQUEST),
+            "inprop": "url",
+            "redirects": "1",
+            "titles": "|".join(titles),
+        }
+        params.update(cont or {})
+        return scrapy.Request(
+            self.api_url(wiki_url, **params),
+            callback=self.parse_pages,
+            meta={"anime": anime, "wiki_url": wiki_url, "titles": titles, "pages": pages or {}},
+        )
+
+    @staticmethod
+    def _merge_page(pages, page):
+        # Une page revient dans chaque suite avec les propriétés pas encore
+        # servies : on les ajoute à celles déjà reçues
+        merged = pages.setdefault(page["title"], {})
+        for key, value in page.items():
+            if key == "revisions":
+                merged.setdefault("revisions", []).extend(value)
+            elif key not in merged:
+                merged[key] = value
+
+    def parse_pages(self, response):
+        data = json.loads(response.text)
+        pages = response.meta["pages"]
+        for page in data.get("query", {}).get("pages", []):
+            self._merge_page(pages, page)
+
+        # Réponse tronquée (limite de taille de l'API) : certaines pages n'ont
+        # pas encore leur wikitext, on redemande la suite avec "continue"
+        cont = data.get("continue")
+        if cont:
+            self.crawler.stats.inc_value("api/continue", spider=self)
+            yield self._pages_request(
+                response.meta["wiki_url"], response.meta["anime"],
+                response.meta["titles"], cont, pages,
+            )
+            return
+
+        scraped_at = datetime.utcnow().isoformat()
+        for page in pages.values():
+            if page.get("missing") or not page.get("revisions"):
+                continue
+
+            wikitext = page["revisions"][0].get("slots", {}).get("main", {}).get("content", "")
+            fields = extract_wikitext(wikitext)
+
+            item = CharacterItem()
+            item["name"] = page["title"]
+            item["anime"] = response.meta.get("anime")
+            item["character_url"] = canonicalize_url(page.get("fullurl") or response.url)
+            item["gender"] = fields.get("gender") or "Unknown"
+            item["status"] = fields.get("status") or "Unknown"
+            item["image_url"] = page.get("original", {}).get("source")
+            item["scraped_at"] = scraped_at
+            yield item
@@ -1,6 +1,9 @@
 import scrapy
+from crawler.infobox import extract_fields
 from crawler.items import CharacterItem
+from crawler.urls import canonical_url
 from datetime import datetime
+from urllib.parse import urlparse
 
 
 class CharactersSpider(scrapy.Spider):
@@ -33,9 +36,32 @@ class CharactersSpider(scrapy.Spider):
         "https://shigatsu-wa-kimi-no-uso.fandom.com/wiki/Category:Characters",
         "https://tokyorevengers.fandom.com/wiki/Category:Characters", ]
 
+    def __init__(self, start_urls=None, shard=None, shards=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # -a start_urls=url1,url2 : crawler un sous-ensemble de wikis (ou un
+        # serveur local pour les benchmarks) au lieu de la liste par défaut
+        if start_urls:
+            if isinstance(start_urls, str):
+                start_urls = [u.strip() for u in start_urls.split(",") if u.strip()]
+            self.start_urls = list(start_urls)
+            self.allowed_domains = sorted({urlparse(u).hostname for u in self.start_urls})
+
+        # -a shard=i -a shards=n : ne garder qu'un wiki sur n (crawl parallèle
+        # lancé par import_characters.run_scrapy)
+        self.shard = None
+        if shards and int(shards) > 1:
+            self.shard = int(shard)
+            self.start_urls = self.start_urls[self.shard::int(shards)]
+
+    @staticmethod
+    def anime_name(url):
+        # Nom de l'anime tiré du sous-domaine du wiki (aussi utilisé par le
+        # mode worker d'import_characters)
+        return url.split("//")[1].split(".")[0].replace("-", " ")
+
     def parse(self, response):
         # Parse Category:Characters pages
-        anime_name = response.url.split("//")[1].split(".")[0].replace("-", " ")
+        anime_name = self.anime_name(response.url)
 
         character_links = response.css(
             "div.category-page__members a.category-page__member-link::attr(href)"
@@ -45,7 +71,7 @@ class CharactersSpider(scrapy.Spider):
             yield response.follow(
                 link,
                 callback=self.parse_character,
-                meta={"anime": anime_name}
+                meta={"anime": anime_name, "incremental": True, "character": True}
             )
 
         next_page = response.css(
@@ -64,53 +90,14 @@ class CharactersSpider(scrapy.Spider):
         ).get()
 
         item["anime"] = response.meta.get("anime")
-        item["character_url"] = response.url
-
-        # --- Gender ---
-        # Rendre insensible à la casse
-        gender_parts = response.xpath(
-            '//div[contains(@class,"pi-item") and '
-            "translate(@data-source, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')='gender']"
-            '//div[contains(@class,"pi-data-value")]//text()'
-        ).getall()
-        gender = " ".join(g.strip() for g in gender_parts if g.strip())
-
-        if not gender:
-            gender_td = response.xpath(
-                '//td[b[contains(normalize-space(.),"Gender")]]/following-sibling::td//text()'
-            ).getall()
-            gender = " ".join(g.strip() for g in gender_td if g.strip())
-
-        item["gender"] = gender or "Unknown"
-
-        # --- Status ---
-        # Rendre insensible à la casse
-        status = response.xpath(
-            "normalize-space(string(//div[translate(@data-source, "
-            "'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')='status']"
-            "//div[contains(@class,'pi-data-value')]))"
-        ).get()
+        item["character_url"] = canonical_url(response)
 
-        if not status:
-            status_parts = response.xpath(
-                '//div[contains(@class,"pi-item") and '
-                "translate(@data-source, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')='status']"
-                '//div[contains(@class,"pi-data-value")]//div[contains(@class,"mw-collapsible-content")]//text()'
-            ).getall()
-            status = " ".join(p.strip() for p in status_parts if p.strip())
-
-        if not status:
-            status_td = response.xpath(
-                '//td[b[contains(normalize-space(.),"Status")]]/following-sibling::td//text()'
-            ).getall()
-            status = " ".join(p.strip() for p in status_td if p.strip())
-
-        item["status"] = status.strip() if status else "Unknown"
-
-        # --- Image principale ---
-        item["image_url"] = response.css(
-            "figure.pi-item img::attr(src)"
-        ).get()
+        # Infobox (ou tableau td/b) lue en un seul parcours
+        fields = extract_fields(response)
+
+        item["gender"] = fields.get("gender") or "Unknown"
+        item["status"] = fields.get("status") or "Unknown"
+        item["image_url"] = fields.get("image")
 
         item["scraped_at"] = datetime.utcnow().isoformat()
 
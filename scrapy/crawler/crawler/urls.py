@@ -0,0 +1,65 @@
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+# Forme canonique des URLs de pages wiki, pour que les variantes d'une même
+# page (paramètres de tracking, espaces encodés, ancre, casse de l'hôte) ne
+# soient demandées qu'une fois.
+
+# Caractères laissés tels quels dans le chemin, comme MediaWiki
+PATH_SAFE = "/:()!,'*;@$~"
+
+# Espaces de noms qui ne sont jamais des pages personnage
+SKIPPED_NAMESPACES = (
+    "Category:", "File:", "Template:", "User:", "User_blog:", "Special:",
+    "Help:", "Forum:", "Message_Wall:", "Talk:", "MediaWiki:",
+)
+
+
+def canonicalize_url(url):
+    # Hôte en minuscules, sans ancre ; les pages d'article perdent leur query
+    # (?so=search, ?action=...) mais les pages de catégorie la gardent pour la
+    # pagination. Le titre suit la convention MediaWiki : "_" pour les
+    # espaces, première lettre en majuscule.
+    parts = urlsplit(url)
+    path = unquote(parts.path).replace(" ", "_")
+    query = parts.query
+
+    if path.startswith("/wiki/"):
+        title = path[len("/wiki/"):]
+        if title:
+            title = title[0].upper() + title[1:]
+        path = "/wiki/" + title
+        if not title.startswith("Category:"):
+            query = ""
+
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        quote(path, safe=PATH_SAFE),
+        query,
+        "",
+    ))
+
+
+def page_title(url):
+    path = unquote(urlsplit(url).path)
+    if not path.startswith("/wiki/"):
+        return ""
+    return path[len("/wiki/"):].replace("_", " ")
+
+
+def is_character_title(title):
+    # Listes, pages d'homonymie et autres espaces de noms : pas des personnages
+    if not title:
+        return False
+    if title.startswith("List of") or title.startswith("List_of"):
+        return False
+    if "(disambiguation)" in title.lower():
+        return False
+    return not title.replace(" ", "_").startswith(SKIPPED_NAMESPACES)
+
+
+def canonical_url(response):
+    # L'URL déclarée par la page (<link rel="canonical">), sinon celle de la
+    # réponse (après redirections)
+    href = response.css('link[rel="canonical"]::attr(href)').get()
+    return canonicalize_url(response.urljoin(href) if href else response.url)
@@ -0,0 +1,133 @@
+import contextlib
+import os
+import threading
+import time
+
+import streamlit as st
+from sqlalchemy import create_engine, event
+
+import queries
+
+# Accès à la base partagé par toutes les pages Streamlit.
+#
+# Un seul engine (et donc un seul pool de connexions) par process, créé via
+# st.cache_resource : il n'est plus recréé à chaque rerun ni à chaque session.
+# Chaque requête est chronométrée ; avec DB_TIMINGS=1, le temps passé en base
+# pendant un rendu de page est affiché dans la sidebar et dans le log.
+#
+# Avec DATA_SOURCE=snapshot, les pages lisent le snapshot Arrow écrit par
+# l'import (SNAPSHOT_PATH, voir snapshot.py) au lieu de PostgreSQL : connect()
+# renvoie alors la table mappée en mémoire et `source` est le module snapshot,
+# qui expose les mêmes fonctions que queries.py.
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_TIMINGS = os.environ.get("DB_TIMINGS", "0") == "1"
+
+# Délai max avant qu'une page voie un nouvel import (une requête d'une ligne)
+DATA_VERSION_TTL = int(os.environ.get("DATA_VERSION_TTL", "2"))
+
+# "postgres" (défaut) ou "snapshot"
+DATA_SOURCE = os.environ.get("DATA_SOURCE", "postgres")
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "/var/lib/anime-snapshot/characters.arrow")
+USE_SNAPSHOT = DATA_SOURCE == "snapshot"
+
+if USE_SNAPSHOT:
+    import snapshot as source
+else:
+    source = queries
+
+# Chaque session Streamlit exécute son script dans son propre thread
+_local = threading.local()
+
+
+def _summary(statement):
+    return " ".join(statement.split())[:80]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.append((_summary(statement), time.perf_counter() - context._query_start))
+
+
+@st.cache_resource
+def get_engine():
+    engine = create_engine(
+        os.environ["DATABASE_URL"],
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def data_version():
+    if USE_SNAPSHOT:
+        return source.version(SNAPSHOT_PATH)
+    with get_engine().connect() as conn:
+        return queries.get_data_version(conn)
+
+
+# Un seul snapshot mappé par process, rechargé quand sa version change
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _snapshot_table(version):
+    return source.open_table(SNAPSHOT_PATH)
+
+
+def missing_config():
+    # Message à afficher si la source de données n'est pas configurée
+    if USE_SNAPSHOT:
+        if not os.path.exists(SNAPSHOT_PATH):
+            return f"Snapshot introuvable : {SNAPSHOT_PATH}. Lance l'import avec SNAPSHOT_PATH."
+        return None
+    if not os.environ.get("DATABASE_URL"):
+        return "DATABASE_URL manquante. Lance via docker-compose."
+    return None
+
+
+@contextlib.contextmanager
+def connect():
+    # Connexion SQL, ou table Arrow du snapshot, à passer aux fonctions de `source`
+    if USE_SNAPSHOT:
+        yield _snapshot_table(data_version())
+        return
+    with get_engine().connect() as conn:
+        yield conn
+
+
+# -----------------------------
+# Temps passé en base par rendu
+# -----------------------------
+def start_timings():
+    _local.timings = []
+
+
+def timings():
+    return list(getattr(_local, "timings", None) or [])
+
+
+def show_timings(page):
+    # Les requêtes servies par st.cache_data n'atteignent pas la base et
+    # n'apparaissent donc pas ici
+    if not DB_TIMINGS:
+        return
+
+    rows = timings()
+    total_ms = sum(t for _, t in rows) * 1000
+    print(f"[DB] {page} : {len(rows)} requêtes, {total_ms:.1f} ms")
+
+    with st.sidebar.expander(f"Temps DB : {total_ms:.1f} ms ({len(rows)} requêtes)"):
+        for statement, seconds in rows:
+            st.caption(f"{seconds * 1000:.1f} ms — {statement}")
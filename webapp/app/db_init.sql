@@ -1,12 +1,83 @@
+-- Genre et statut normalisés (normalization.py) : enums de 4 octets
+DO $$ BEGIN
+  CREATE TYPE character_gender AS ENUM ('Male', 'Female', 'Unknown');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE TYPE character_status AS ENUM ('Alive', 'Deceased', 'Unknown');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Dimension anime : slug (valeur "anime" des items, sous-domaine du wiki),
+-- nom affiché et URL du wiki
+CREATE TABLE IF NOT EXISTS animes (
+  id SMALLSERIAL PRIMARY KEY,
+  slug TEXT NOT NULL UNIQUE,
+  name TEXT NOT NULL,
+  wiki_url TEXT
+);
+
+-- Colonnes de taille fixe d'abord (pas de bourrage d'alignement).
+-- Une base créée avec l'ancien schéma (anime, gender, status en TEXT) est
+-- migrée par import_characters.init_db (migrate_characters).
 CREATE TABLE IF NOT EXISTS characters (
   id SERIAL PRIMARY KEY,
+  anime_id SMALLINT REFERENCES animes (id),
+  gender character_gender NOT NULL DEFAULT 'Unknown',
+  status character_status NOT NULL DEFAULT 'Unknown',
+  scraped_at TIMESTAMP,
   name TEXT NOT NULL,
-  anime TEXT,
   character_url TEXT UNIQUE,
-  gender TEXT,
-  status TEXT,
-  image_url TEXT
+  image_url TEXT,
+  image_path TEXT,
+  search_text TEXT
 );
 
 CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name);
-CREATE INDEX IF NOT EXISTS idx_characters_anime ON characters (anime);
+
+-- Regroupements des graphiques (anime, statut) et (anime, genre), et filtre
+-- par anime seul (préfixe)
+CREATE INDEX IF NOT EXISTS idx_characters_anime_status ON characters (anime_id, status);
+CREATE INDEX IF NOT EXISTS idx_characters_anime_gender ON characters (anime_id, gender);
+
+-- Recherche de la sidebar (pg_trgm, voir queries.py) : search_text (nom,
+-- anime, genre, statut en minuscules) est écrit par l'import
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_characters_search_trgm
+  ON characters USING gin (search_text gin_trgm_ops);
+
+-- Agrégats des graphiques du dashboard, rafraîchis après chaque import
+CREATE MATERIALIZED VIEW IF NOT EXISTS character_stats AS
+SELECT
+  COALESCE(a.name, 'Unknown') AS anime,
+  c.gender::text AS gender,
+  c.status::text AS status,
+  count(*) AS count
+FROM characters c
+LEFT JOIN animes a ON a.id = c.anime_id
+GROUP BY 1, 2, 3;
+
+-- Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_character_stats_key
+  ON character_stats (anime, gender, status);
+
+-- Version des données, incrémentée par l'import pour invalider les caches du webapp
+CREATE TABLE IF NOT EXISTS dataset_version (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  version BIGINT NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Jobs du mode worker (import_characters.py --worker) : un par anime
+CREATE TABLE IF NOT EXISTS crawl_jobs (
+  anime TEXT PRIMARY KEY,
+  start_url TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  last_success_at TIMESTAMP,
+  changed INTEGER,
+  error TEXT
+);
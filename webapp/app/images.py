@@ -0,0 +1,294 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+# Cache d'images partagé par la galerie et le quiz.
+#
+# Les images sont stockées sur disque et adressées par leur contenu :
+#   urls/<sha1(url)>            -> sha256 du contenu téléchargé
+#   blobs/<sha256>              -> image originale
+#   thumbs/<sha256>_<largeur>   -> miniature encodée (WEBP)
+# Deux URLs qui pointent vers la même image partagent donc le même fichier.
+# Le cache survit aux redémarrages et sa taille est bornée : au-delà de
+# IMAGE_CACHE_MAX_MB, les fichiers les moins récemment utilisés sont supprimés.
+# Les pages reçoivent des octets encodés, pas des objets PIL.Image décodés.
+
+# Portraits téléchargés pendant le crawl (PortraitPipeline, DOWNLOAD_PORTRAITS=1) :
+#   <PORTRAIT_STORE>/full/<sha1>.jpg et thumbs/w<largeur>/<sha1>.jpg
+# Quand un personnage a un image_path, l'image est lue sur ce disque, sans
+# aucune requête sortante.
+PORTRAIT_STORE = os.environ.get("PORTRAIT_STORE")
+
+IMAGE_CACHE_DIR = Path(os.environ.get(
+    "IMAGE_CACHE_DIR", Path(tempfile.gettempdir()) / "anime-images"
+))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Largeurs de miniatures générées : une demande est arrondie à la largeur
+# supérieure (colonnes de la galerie de 2 à 6, image du quiz)
+THUMB_WIDTHS = (128, 192, 256, 384, 512)
+THUMB_FORMAT = "WEBP"
+THUMB_QUALITY = 85
+
+REQUEST_TIMEOUT = 10
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Téléchargements concurrents : un pool pour les images affichées, un plus
+# petit pour le préchargement en arrière-plan, qui ne doit pas les retarder
+IMAGE_FETCH_WORKERS = int(os.environ.get("IMAGE_FETCH_WORKERS", "8"))
+IMAGE_PREFETCH_WORKERS = int(os.environ.get("IMAGE_PREFETCH_WORKERS", "2"))
+
+
+def _make_session():
+    # Session partagée : connexions keep-alive réutilisées vers
+    # static.wikia.nocookie.net, une par thread du pool au plus
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=IMAGE_FETCH_WORKERS + IMAGE_PREFETCH_WORKERS,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def _thumb_width(width):
+    for w in THUMB_WIDTHS:
+        if width <= w:
+            return w
+    return THUMB_WIDTHS[-1]
+
+
+def _write_atomic(path, data):
+    # Écriture dans un fichier temporaire puis renommage : un autre process
+    # ne lit jamais un fichier à moitié écrit
+    fd, tmp = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    # La date de modification sert d'horodatage LRU
+    path.touch()
+    return data
+
+
+class ImageCache:
+    def __init__(self, root=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        self._session = _make_session()
+        for sub in ("urls", "blobs", "thumbs"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    # -----------------------------
+    # Originaux
+    # -----------------------------
+    def _download(self, url):
+        try:
+            r = self._session.get(url, timeout=REQUEST_TIMEOUT)
+            r.raise_for_status()
+            return r.content
+        except requests.RequestException:
+            return None
+
+    def _index(self, url):
+        return self.root / "urls" / hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _indexed_digest(self, url):
+        # sha256 déjà connu pour l'URL, que l'original soit encore là ou non
+        if not isinstance(url, str) or not url.startswith("http"):
+            return None
+        try:
+            return self._index(url).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def digest(self, url):
+        # Renvoie le sha256 du contenu de l'URL, en la téléchargeant si besoin
+        if not isinstance(url, str) or not url.startswith("http"):
+            return None
+
+        index = self._index(url)
+        digest = self._indexed_digest(url)
+        if digest and (self.root / "blobs" / digest).exists():
+            return digest
+
+        data = self._download(url)
+        if data is None:
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.root / "blobs" / digest
+        if not blob.exists():
+            _write_atomic(blob, data)
+            self._account(len(data))
+        _write_atomic(index, digest.encode("ascii"))
+        return digest
+
+    def original(self, url):
+        digest = self.digest(url)
+        if digest is None:
+            return None
+        return _read(self.root / "blobs" / digest)
+
+    # -----------------------------
+    # Miniatures
+    # -----------------------------
+    def thumbnail(self, url, width):
+        width = _thumb_width(width)
+
+        # Miniature déjà en cache : servie par l'index, même si l'original a
+        # été évincé entre-temps (pas de nouveau téléchargement)
+        digest = self._indexed_digest(url)
+        if digest:
+            data = _read(self.root / "thumbs" / f"{digest}_{width}")
+            if data is not None:
+                return data
+
+        digest = self.digest(url)
+        if digest is None:
+            return None
+
+        path = self.root / "thumbs" / f"{digest}_{width}"
+        data = _read(path)
+        if data is not None:
+            return data
+
+        original = _read(self.root / "blobs" / digest)
+        if original is None:
+            return None
+        try:
+            data = self._resize(original, width)
+        except OSError:
+            return None
+
+        _write_atomic(path, data)
+        self._account(len(data))
+        return data
+
+    @staticmethod
+    def _resize(data, width):
+        img = Image.open(BytesIO(data))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        out = BytesIO()
+        img.save(out, THUMB_FORMAT, quality=THUMB_QUALITY)
+        return out.getvalue()
+
+    # -----------------------------
+    # Éviction LRU
+    # -----------------------------
+    def _files(self):
+        for sub in ("blobs", "thumbs"):
+            for entry in os.scandir(self.root / sub):
+                if entry.is_file():
+                    yield entry
+
+    def _account(self, nbytes):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(e.stat().st_size for e in self._files())
+            else:
+                self._size += nbytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Supprime les fichiers les moins récemment lus jusqu'à 80% du budget
+        target = self.max_bytes * 0.8
+        entries = sorted(self._files(), key=lambda e: e.stat().st_mtime)
+        size = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                st_size = entry.stat().st_size
+                os.remove(entry.path)
+                size -= st_size
+            except FileNotFoundError:
+                pass
+        self._size = size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Pools partagés par toutes les sessions Streamlit du process
+_fetch_pool = ThreadPoolExecutor(IMAGE_FETCH_WORKERS, thread_name_prefix="image-fetch")
+_prefetch_pool = ThreadPoolExecutor(IMAGE_PREFETCH_WORKERS, thread_name_prefix="image-prefetch")
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache()
+    return _cache
+
+
+def _local_path(image_path, width):
+    if not PORTRAIT_STORE or not isinstance(image_path, str) or not image_path:
+        return None
+
+    store = Path(PORTRAIT_STORE)
+    thumb = store / "thumbs" / f"w{_thumb_width(width)}" / Path(image_path).name
+    for path in (thumb, store / image_path):
+        if path.is_file():
+            return path
+    return None
+
+
+def local_thumbnail(image_path, width):
+    path = _local_path(image_path, width)
+    return path.read_bytes() if path else None
+
+
+def get_thumbnail(url, width, image_path=None):
+    data = local_thumbnail(image_path, width)
+    if data is not None:
+        return data
+    return get_cache().thumbnail(url, width)
+
+
+def iter_thumbnails(urls, width, image_paths=None):
+    # Télécharge toutes les miniatures en parallèle et renvoie (position, octets)
+    # dans l'ordre d'arrivée, pour afficher chaque image dès qu'elle est prête
+    image_paths = image_paths or [None] * len(urls)
+    futures = {
+        _fetch_pool.submit(get_thumbnail, url, width, path): i
+        for i, (url, path) in enumerate(zip(urls, image_paths))
+    }
+    for future in as_completed(futures):
+        try:
+            data = future.result()
+        except Exception:
+            data = None
+        yield futures[future], data
+
+
+def prefetch_thumbnails(urls, width, image_paths=None):
+    # Remplit le cache disque en arrière-plan, sans attendre le résultat.
+    # Les portraits déjà présents dans le store local n'ont rien à précharger.
+    image_paths = image_paths or [None] * len(urls)
+    for url, path in zip(urls, image_paths):
+        if _local_path(path, width) is None:
+            _prefetch_pool.submit(get_thumbnail, url, width)
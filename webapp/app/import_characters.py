@@ -1,9 +1,17 @@
+import argparse
+import io
 import json
 import os
 import subprocess
+import sys
+import time
+from itertools import islice
 from pathlib import Path
+from urllib.parse import urlsplit
 from sqlalchemy import create_engine, text
 
+from normalization import GENDERS, STATUSES, normalize_gender, normalize_status
+
 # Configuration pour le scraping en temps réel et l'import des données dans la DB
 DB_URL = os.environ["DATABASE_URL"]
 
@@ -16,115 +24,848 @@ JSON_PATH = Path(os.environ.get("JSON_PATH", SCRAPY_DIR / "characters.json")).re
 SPIDER_NAME = os.environ.get("SPIDER_NAME", "characters")
 RUN_SCRAPY_ON_START = os.environ.get("RUN_SCRAPY_ON_START", "1") == "1"
 
+# Nombre de process scrapy lancés en parallèle, chacun sur une partie des wikis
+CRAWL_SHARDS = int(os.environ.get("CRAWL_SHARDS", "1"))
+
+# Les items sont écrits en base par le crawl lui-même (crawler.pipelines.
+# DatabasePipeline) : le flux JSON n'est alors écrit que si WRITE_FEED=1, et
+# n'est pas réimporté
+STREAM_TO_DB = os.environ.get("STREAM_TO_DB", "0") == "1"
+WRITE_FEED = os.environ.get("WRITE_FEED", "0" if STREAM_TO_DB else "1") == "1"
+
+# Crawl incrémental (INCREMENTAL_CRAWL=1) : chaque crawl lancé ici met les
+# pages extraites en attente dans le store, sous le nom de son flux. Elles ne
+# sont validées (commit_crawl) qu'une fois le flux importé, ou le crawl
+# terminé avec STREAM_TO_DB.
+INCREMENTAL_CRAWL = os.environ.get("INCREMENTAL_CRAWL", "0") == "1"
+INCREMENTAL_STORE = SCRAPY_DIR / os.environ.get("INCREMENTAL_STORE", ".incremental/pages.sqlite")
+
+# Mode worker (--worker) : chaque wiki est recrawlé toutes les REFRESH_INTERVAL
+# secondes, un échec est retenté après RETRY_DELAY secondes
+REFRESH_INTERVAL = int(os.environ.get("REFRESH_INTERVAL", str(6 * 3600)))
+RETRY_DELAY = int(os.environ.get("RETRY_DELAY", "600"))
+WORKER_POLL = int(os.environ.get("WORKER_POLL", "60"))
+
+# "bulk" : COPY par lots dans une table temporaire puis un seul upsert
+# "row"  : un INSERT ... ON CONFLICT par personnage (ancien comportement)
+IMPORT_MODE = os.environ.get("IMPORT_MODE", "bulk")
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Snapshot Arrow lu par les pages avec DATA_SOURCE=snapshot (voir snapshot.py),
+# réécrit après chaque import qui modifie des lignes
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH")
+
+# Extensions reconnues comme flux JSON Lines (un item par ligne)
+JSONLINES_SUFFIXES = (".jl", ".jsonl")
+
+CHARACTER_COLUMNS = (
+    "name", "anime", "character_url", "gender", "status", "image_url", "image_path",
+    "scraped_at",
+)
+
+# Nom affiché des animes (table animes), par slug (sous-domaine du wiki, la
+# valeur "anime" des items). Un anime absent d'ici est affiché sous son slug.
+ANIME_NAMES = {
+    "obluda": "Obluda",
+    "nana": "Nana",
+    "dr stone": "Dr. Stone",
+    "madeinabyss": "Made in Abyss",
+    "dandadan": "Dandadan",
+    "kaichouwamaidsama": "Kaichou wa Maid-sama!",
+    "ao haru ride": "Ao Haru Ride",
+    "sayiloveyou": "Say \"I Love You\"",
+    "kiminitodoke": "Kimi ni Todoke",
+    "watashi ga motete dousunda": "Watashi ga Motete Dousunda",
+    "bokudakegainaimachi": "Boku dake ga Inai Machi",
+    "violet evergarden": "Violet Evergarden",
+    "ansatsukyoshitsu": "Assassination Classroom",
+    "fruitsbasket": "Fruits Basket",
+    "detectiveconan": "Detective Conan",
+    "dragonball": "Dragon Ball",
+    "codegeass": "Code Geass",
+    "gintama": "Gintama",
+    "swordartonline": "Sword Art Online",
+    "noragami": "Noragami",
+    "mob psycho 100": "Mob Psycho 100",
+    "vinlandsaga": "Vinland Saga",
+    "shigatsu wa kimi no uso": "Shigatsu wa Kimi no Uso",
+    "tokyorevengers": "Tokyo Revengers",
+}
+
 
 # -----------------------------
-# UTILS
+# Lecture en flux du fichier scrapé
 # -----------------------------
-def normalize_gender(gender: str) -> str:
-    if not isinstance(gender, str) or not gender.strip():
-        return "Unknown"
-
-    g = gender.strip().lower()
-
-    if "♀" in g:
-        return "Female"
-    if "♂" in g:
-        return "Male"
-
-    if "female" in g:
-        return "Female"
-    if "male" in g:
-        return "Male"
+def _skip(buf, pos, chars):
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
+
+
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+
+
+def _incomplete(buf, pos):
+    # La fin du buffer à partir de pos peut être un nombre ou un littéral
+    # coupé par la lecture par blocs (vide compris)
+    if _skip(buf, pos, NUMBER_CHARS) == len(buf):
+        return True
+    return len(buf) - pos < 9 and any(lit.startswith(buf[pos:]) for lit in LITERALS)
+
+
+def _cut(buf, e):
+    # Erreur due à un item coupé en fin de buffer, et non à du JSON invalide
+    if e.msg.startswith("Unterminated string"):
+        return True
+    if e.msg.startswith("Invalid \\uXXXX escape"):
+        return len(buf) - e.pos <= 6
+    return _incomplete(buf, e.pos)
+
+
+def iter_json_array(f, chunk_size=JSON_CHUNK_SIZE):
+    # Parse un tableau JSON élément par élément, sans charger tout le fichier :
+    # seul l'item en cours de décodage (et un bloc de lecture) reste en mémoire.
+    # Un bloc n'est ajouté que si l'item touche la fin du buffer ; une erreur
+    # au milieu du buffer est levée tout de suite, avec sa position.
+    decoder = json.JSONDecoder()
+    buf, pos, offset, eof = "", 0, 0, False
+
+    def refill(keep=None):
+        # Garde buf[keep:] (par défaut buf[pos:]) et y ajoute un bloc ; False
+        # en fin de fichier
+        nonlocal buf, pos, offset, eof
+        keep = pos if keep is None else keep
+        chunk = "" if eof else f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf, offset, pos = buf[keep:] + chunk, offset + keep, pos - keep
+        return True
+
+    def peek():
+        # Premier caractère non blanc à partir de pos, None en fin de fichier
+        nonlocal pos
+        while True:
+            pos = _skip(buf, pos, " \t\r\n")
+            if pos < len(buf):
+                return buf[pos]
+            if not refill():
+                return None
+
+    def invalid(msg, at):
+        return ValueError(f"JSON invalide à la position {offset + at} : {msg}")
+
+    first = peek()
+    if first is None:
+        return
+    if first != "[":
+        raise ValueError("Le fichier JSON doit contenir un tableau d'items")
+    pos += 1
+    if peek() == "]":
+        return
 
-    return "Unknown"
+    while True:
+        pos = _skip(buf, pos, " \t\r\n")
+        if pos == len(buf) and peek() is None:
+            raise ValueError("Fichier JSON tronqué")
+        start = pos
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if not _cut(buf, e):
+                raise invalid(e.msg, e.pos) from None
+            if refill():
+                continue
+            raise ValueError(f"Fichier JSON tronqué (position {offset + e.pos})") from None
+
+        pos = _skip(buf, end, " \t\r\n")
+        if pos == len(buf) or buf[pos] not in ",]":
+            # Un nombre ou un littéral qui finit en fin de buffer peut
+            # continuer dans le bloc suivant : on relit la valeur avec un bloc
+            # de plus
+            if _incomplete(buf, pos) and refill(start):
+                pos = 0
+                continue
+            sep = peek()
+            if sep is None:
+                raise ValueError("Fichier JSON tronqué")
+            if sep not in ",]":
+                raise invalid("',' ou ']' attendu", pos)
+        sep = buf[pos]
+        yield obj
+        if sep == "]":
+            return
+        pos += 1
 
+        if pos > chunk_size:
+            buf, offset, pos = buf[pos:], offset + pos, 0
 
-def normalize_status(status: str) -> str:
-    if not isinstance(status, str) or not status.strip():
-        return "Unknown"
 
-    s = status.strip().lower()
+def iter_json_lines(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
 
-    if "alive" in s:
-        return "Alive"
-    if "deceased" in s:
-        return "Deceased"
 
-    return "Unknown"
+def iter_items(f, path):
+    if Path(path).suffix in JSONLINES_SUFFIXES:
+        return iter_json_lines(f)
+    return iter_json_array(f)
 
 
 # -----------------------------
 # Fonction pour lancer le spider Scrapy
 # -----------------------------
-def run_scrapy():
+def _shard_feed(i):
+    return JSON_PATH.with_name(f"{JSON_PATH.stem}.shard{i}{JSON_PATH.suffix}")
+
+
+def _feed_args(feed):
+    # Le nom du flux sert aussi de lot pour le store incrémental
+    args = ["-O", str(feed)] if WRITE_FEED else []
+    if INCREMENTAL_CRAWL:
+        args += ["-s", f"INCREMENTAL_PENDING={Path(feed).name}"]
+    return args
+
+
+def commit_crawl(feed):
+    # Après l'import du flux : ses pages ne seront plus relues tant qu'elles
+    # ne changent pas
+    if not INCREMENTAL_CRAWL:
+        return
+    if str(SCRAPY_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRAPY_DIR))
+    from crawler.middlewares import commit_pending
+
+    count = commit_pending(INCREMENTAL_STORE, Path(feed).name)
+    print(f"[SCRAPY] {count} pages validées dans le store incrémental ({Path(feed).name}).")
+
+
+def run_parallel(jobs, max_running, on_start=None):
+    # jobs : liste de (clé, commande scrapy). Au plus max_running process en
+    # même temps ; renvoie (clé, code retour) dès qu'un process se termine.
+    # on_start(clé) est appelé au lancement effectif de chaque process.
+    pending, running = list(jobs), {}
+    while pending or running:
+        while pending and len(running) < max_running:
+            key, cmd = pending.pop(0)
+            running[subprocess.Popen(cmd, cwd=str(SCRAPY_DIR))] = key
+            if on_start is not None:
+                on_start(key)
+        for proc in [p for p in running if p.poll() is not None]:
+            yield running.pop(proc), proc.returncode
+        time.sleep(1)
+
+
+def run_scrapy(shards=CRAWL_SHARDS):
+    # Le format du flux suit l'extension de JSON_PATH (.json ou .jl).
+    # Avec plusieurs shards, chaque process crawle un sous-ensemble des wikis
+    # (start_urls[i::shards]) et écrit son propre flux. Un wiki n'est crawlé
+    # que par un process : la politesse par domaine est inchangée. Les flux
+    # sont renvoyés au fur et à mesure que les process se terminent, pour être
+    # importés sans attendre les autres (rien à importer avec STREAM_TO_DB).
     print(f"[SCRAPY] cwd = {SCRAPY_DIR}")
-    subprocess.run(
-        ["scrapy", "crawl", SPIDER_NAME, "-O", str(JSON_PATH.name)],
-        cwd=str(SCRAPY_DIR),
-        check=True,
-    )
-    print("[SCRAPY] Terminé.")
+    if shards <= 1:
+        subprocess.run(
+            ["scrapy", "crawl", SPIDER_NAME] + _feed_args(JSON_PATH.name),
+            cwd=str(SCRAPY_DIR),
+            check=True,
+        )
+        print("[SCRAPY] Terminé.")
+        if STREAM_TO_DB:
+            commit_crawl(JSON_PATH)
+        else:
+            yield JSON_PATH
+        return
+
+    jobs = [
+        (i, ["scrapy", "crawl", SPIDER_NAME,
+             "-a", f"shard={i}", "-a", f"shards={shards}"] + _feed_args(_shard_feed(i)))
+        for i in range(shards)
+    ]
+    print(f"[SCRAPY] {shards} shards lancés.")
+
+    failed = []
+    for i, returncode in run_parallel(jobs, shards):
+        if returncode != 0:
+            print(f"[SCRAPY] Shard {i} en échec (code {returncode}).")
+            failed.append(i)
+            continue
+        print(f"[SCRAPY] Shard {i} terminé.")
+        if STREAM_TO_DB:
+            commit_crawl(_shard_feed(i))
+        else:
+            yield _shard_feed(i)
+
+    # Les shards réussis sont importés quand même ; les autres le seront au
+    # prochain crawl
+    if failed:
+        print(f"[SCRAPY] Terminé, shards en échec : {failed}")
+    else:
+        print("[SCRAPY] Terminé.")
 
 
 # -----------------------------
 # Database
 # -----------------------------
+def _enum_sql(name, values):
+    labels = ", ".join(f"'{v}'" for v in values)
+    return f"""
+    DO $$ BEGIN
+        CREATE TYPE {name} AS ENUM ({labels});
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$;
+    """
+
+
 def init_db(engine):
+    renamed = []
     with engine.begin() as conn:
+        # Le web et le worker démarrent en même temps : un seul crée le schéma
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('init_db'))"))
+
+        # Genre et statut normalisés (normalization.py) : un enum de 4 octets
+        # au lieu d'un TEXT par ligne
+        conn.execute(text(_enum_sql("character_gender", GENDERS)))
+        conn.execute(text(_enum_sql("character_status", STATUSES)))
+
+        # Dimension anime : un smallint par personnage au lieu du nom en TEXT
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS animes (
+            id SMALLSERIAL PRIMARY KEY,
+            slug TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            wiki_url TEXT
+        );
+        """))
+
+        # Colonnes de taille fixe d'abord (pas de bourrage d'alignement)
         conn.execute(text("""
         CREATE TABLE IF NOT EXISTS characters (
             id SERIAL PRIMARY KEY,
+            anime_id SMALLINT REFERENCES animes (id),
+            gender character_gender NOT NULL DEFAULT 'Unknown',
+            status character_status NOT NULL DEFAULT 'Unknown',
+            scraped_at TIMESTAMP,
             name TEXT NOT NULL,
-            anime TEXT,
             character_url TEXT UNIQUE,
-            gender TEXT,
-            status TEXT,
-            image_url TEXT
+            image_url TEXT,
+            image_path TEXT,
+            search_text TEXT
         );
         """))
+        conn.execute(text(
+            "ALTER TABLE characters ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMP;"
+        ))
+        conn.execute(text(
+            "ALTER TABLE characters ADD COLUMN IF NOT EXISTS image_path TEXT;"
+        ))
+
+        # Base créée avec l'ancien schéma (anime, gender, status en TEXT)
+        old_schema = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'characters' AND column_name = 'anime'
+            )
+        """)).scalar()
+        if old_schema:
+            migrate_characters(conn)
+
+        # Nom affiché changé dans ANIME_NAMES : search_text contient ce nom
+        renamed = conn.execute(text("""
+            UPDATE animes a SET name = v.name
+            FROM unnest(CAST(:slugs AS TEXT[]), CAST(:names AS TEXT[])) AS v (slug, name)
+            WHERE a.slug = v.slug AND a.name IS DISTINCT FROM v.name
+            RETURNING a.id
+        """), {"slugs": list(ANIME_NAMES), "names": list(ANIME_NAMES.values())}).scalars().all()
+        if renamed:
+            count = conn.execute(text("""
+                UPDATE characters c
+                SET search_text = lower(concat_ws(' ', c.name, a.name, c.gender, c.status))
+                FROM animes a
+                WHERE a.id = c.anime_id AND c.anime_id = ANY(:ids)
+            """), {"ids": renamed}).rowcount
+            print(f"[IMPORT] {len(renamed)} animes renommés, search_text recalculé sur {count} lignes.")
+
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name);"))
+        # Regroupements des graphiques (anime, statut) et (anime, genre), et
+        # filtre par anime seul (préfixe)
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_characters_anime_status ON characters (anime_id, status);"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_characters_anime_gender ON characters (anime_id, gender);"
+        ))
+
+        # Recherche de la sidebar : search_text (nom, anime, genre, statut en
+        # minuscules), écrit par l'import et indexé en trigrammes
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_characters_search_trgm
+            ON characters USING gin (search_text gin_trgm_ops);
+        """))
 
+        # Version des données, lue par le webapp pour invalider ses caches
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS dataset_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+        """))
 
-def import_json(engine):
-    if not os.path.exists(JSON_PATH):
-        print(f"[IMPORT] Fichier introuvable : {JSON_PATH}")
-        return
+        # Suivi du mode worker : un job de crawl + import par anime (wiki)
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS crawl_jobs (
+            anime TEXT PRIMARY KEY,
+            start_url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            last_success_at TIMESTAMP,
+            changed INTEGER,
+            error TEXT
+        );
+        """))
 
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        items = json.load(f)
+        # Agrégats des graphiques du dashboard (voir refresh_stats), avec le
+        # nom affiché de l'anime et des valeurs en texte
+        conn.execute(text("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS character_stats AS
+        SELECT
+            COALESCE(a.name, 'Unknown') AS anime,
+            c.gender::text AS gender,
+            c.status::text AS status,
+            count(*) AS count
+        FROM characters c
+        LEFT JOIN animes a ON a.id = c.anime_id
+        GROUP BY 1, 2, 3;
+        """))
+        conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_character_stats_key
+            ON character_stats (anime, gender, status);
+        """))
+
+    # Les graphiques, les caches du webapp et le snapshot portent le nom affiché
+    if renamed:
+        publish(engine)
+
+
+def migrate_characters(conn):
+    # Ancien schéma -> dimension animes + enums, dans la transaction d'init_db.
+    # Une seule réécriture complète de la table (ALTER TYPE), faite en dernier :
+    # elle ne recopie que les lignes vivantes, sans la colonne anime supprimée.
+    start = time.perf_counter()
+    conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS character_stats;"))
+
+    conn.execute(text("""
+        INSERT INTO animes (slug, name, wiki_url)
+        SELECT anime, anime, min(substring(character_url FROM '^https?://[^/]+'))
+        FROM characters
+        WHERE anime IS NOT NULL AND btrim(anime) <> ''
+        GROUP BY anime
+        ON CONFLICT (slug) DO NOTHING;
+    """))
+    conn.execute(text(
+        "UPDATE animes SET name = :name WHERE slug = :slug"
+    ), [{"slug": slug, "name": name} for slug, name in ANIME_NAMES.items()])
+
+    # Valeurs importées avant la normalisation à l'import : les règles ne
+    # tournent que sur les valeurs distinctes
+    for column, normalize in (("gender", normalize_gender), ("status", normalize_status)):
+        values = conn.execute(text(f"SELECT DISTINCT {column} FROM characters")).scalars().all()
+        mapping = [{"old": v, "new": normalize(v)} for v in values if v is not None and normalize(v) != v]
+        if mapping:
+            conn.execute(text(f"UPDATE characters SET {column} = :new WHERE {column} = :old"), mapping)
+
+    # search_text était une colonne générée à partir des colonnes TEXT
+    conn.execute(text("""
+        ALTER TABLE characters
+            DROP COLUMN IF EXISTS search_text,
+            ADD COLUMN search_text TEXT,
+            ADD COLUMN IF NOT EXISTS anime_id SMALLINT REFERENCES animes (id);
+    """))
+    conn.execute(text("""
+        UPDATE characters c SET
+            anime_id = a.id,
+            search_text = lower(concat_ws(' ', c.name, a.name, c.gender, c.status))
+        FROM animes a
+        WHERE a.slug = c.anime;
+    """))
+    conn.execute(text("""
+        UPDATE characters SET search_text = lower(concat_ws(' ', name, gender, status))
+        WHERE search_text IS NULL;
+    """))
+
+    conn.execute(text("DROP INDEX IF EXISTS idx_characters_anime;"))
+    conn.execute(text("""
+        ALTER TABLE characters
+            DROP COLUMN anime,
+            ALTER COLUMN gender TYPE character_gender
+                USING COALESCE(gender, 'Unknown')::character_gender,
+            ALTER COLUMN gender SET DEFAULT 'Unknown',
+            ALTER COLUMN gender SET NOT NULL,
+            ALTER COLUMN status TYPE character_status
+                USING COALESCE(status, 'Unknown')::character_status,
+            ALTER COLUMN status SET DEFAULT 'Unknown',
+            ALTER COLUMN status SET NOT NULL;
+    """))
+    print(f"[IMPORT] Schéma characters migré (animes, enums) en {time.perf_counter() - start:.2f}s.")
+
+
+# Une ligne existante n'est réécrite que si son contenu a changé et que l'item
+# n'est pas plus ancien que la version en base (crawl incrémental).
+# image_path n'est renseigné que si le crawl a téléchargé les portraits : un
+# item sans portrait garde celui déjà en base.
+UPSERT_SET = """
+    ON CONFLICT (character_url) DO UPDATE SET
+        name = EXCLUDED.name,
+        anime_id = EXCLUDED.anime_id,
+        gender = EXCLUDED.gender,
+        status = EXCLUDED.status,
+        image_url = EXCLUDED.image_url,
+        image_path = COALESCE(EXCLUDED.image_path, characters.image_path),
+        scraped_at = EXCLUDED.scraped_at,
+        search_text = EXCLUDED.search_text
+    WHERE (characters.name, characters.anime_id, characters.gender,
+           characters.status, characters.image_url, characters.image_path,
+           characters.search_text)
+        IS DISTINCT FROM
+          (EXCLUDED.name, EXCLUDED.anime_id, EXCLUDED.gender,
+           EXCLUDED.status, EXCLUDED.image_url,
+           COALESCE(EXCLUDED.image_path, characters.image_path),
+           EXCLUDED.search_text)
+      AND (characters.scraped_at IS NULL
+           OR EXCLUDED.scraped_at IS NULL
+           OR EXCLUDED.scraped_at >= characters.scraped_at)
+"""
+
+INSERT_COLUMNS = """
+    INSERT INTO characters (name, anime_id, character_url, gender, status, image_url,
+                            image_path, scraped_at, search_text)
+"""
+
+# L'anime (slug) est remplacé par son id dans animes (voir upsert_animes),
+# le genre et le statut sont convertis en enums
+UPSERT_SQL = text(INSERT_COLUMNS + """
+    SELECT s.name, a.id, s.character_url,
+           CAST(s.gender AS character_gender), CAST(s.status AS character_status),
+           s.image_url, s.image_path, s.scraped_at,
+           lower(concat_ws(' ', s.name, a.name, s.gender, s.status))
+    FROM (
+        SELECT CAST(:name AS TEXT) AS name, CAST(:anime AS TEXT) AS anime,
+               CAST(:character_url AS TEXT) AS character_url,
+               CAST(:gender AS TEXT) AS gender, CAST(:status AS TEXT) AS status,
+               CAST(:image_url AS TEXT) AS image_url, CAST(:image_path AS TEXT) AS image_path,
+               CAST(:scraped_at AS TIMESTAMP) AS scraped_at
+    ) s
+    LEFT JOIN animes a ON a.slug = s.anime
+""" + UPSERT_SET)
+
+# Le DISTINCT ON garde la dernière occurrence d'une URL, comme le mode "row"
+# (un même upsert ne peut pas toucher deux fois la même ligne).
+MERGE_STAGING_SQL = text(INSERT_COLUMNS + """
+    SELECT s.name, a.id, s.character_url,
+           CAST(s.gender AS character_gender), CAST(s.status AS character_status),
+           s.image_url, s.image_path, s.scraped_at,
+           lower(concat_ws(' ', s.name, a.name, s.gender, s.status))
+    FROM (
+        SELECT DISTINCT ON (character_url) *
+        FROM characters_staging
+        ORDER BY character_url, seq DESC
+    ) s
+    LEFT JOIN animes a ON a.slug = s.anime
+""" + UPSERT_SET)
+
+UPSERT_ANIME_SQL = text("""
+    INSERT INTO animes (slug, name, wiki_url) VALUES (:slug, :name, :wiki_url)
+    ON CONFLICT (slug) DO UPDATE SET wiki_url = COALESCE(animes.wiki_url, EXCLUDED.wiki_url)
+    WHERE animes.wiki_url IS NULL
+""")
+
+
+def upsert_animes(conn, animes):
+    # animes : {slug: url d'une page du wiki}, quelques dizaines au plus
+    if not animes:
+        return
+    rows = []
+    for slug, url in animes.items():
+        parts = urlsplit(url or "")
+        wiki_url = f"{parts.scheme}://{parts.netloc}" if parts.netloc else None
+        rows.append({"slug": slug, "name": ANIME_NAMES.get(slug, slug), "wiki_url": wiki_url})
+    conn.execute(UPSERT_ANIME_SQL, rows)
+
+
+def iter_rows(items):
+    # Filtre et normalise les items scrapés, prêts à être insérés
+    for it in items:
+        name = it.get("name")
+        if not name or not it.get("character_url"):
+            continue
+
+        if name.startswith("List of"):
+            continue
+
+        yield {
+            "name": name,
+            "anime": it.get("anime"),
+            "character_url": it.get("character_url"),
+            "gender": normalize_gender(it.get("gender")),
+            "status": normalize_status(it.get("status")),
+            "image_url": it.get("image_url"),
+            "image_path": it.get("image_path"),
+            "scraped_at": it.get("scraped_at"),
+        }
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_value(value):
+    # Format texte de COPY : \N pour NULL, échappement des séparateurs
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
 
-    sql = text("""
-        INSERT INTO characters (name, anime, character_url, gender, status, image_url)
-        VALUES (:name, :anime, :character_url, :gender, :status, :image_url)
-        ON CONFLICT (character_url) DO UPDATE SET
-            name = EXCLUDED.name,
-            anime = EXCLUDED.anime,
-            gender = EXCLUDED.gender,
-            status = EXCLUDED.status,
-            image_url = EXCLUDED.image_url
-    """)
 
+# Les deux modes renvoient (lignes lues, lignes insérées ou réellement modifiées)
+def insert_rows(conn, rows):
+    count = changed = 0
+    seen = set()
+    for row in rows:
+        if row["anime"] and row["anime"] not in seen:
+            seen.add(row["anime"])
+            upsert_animes(conn, {row["anime"]: row["character_url"]})
+        changed += conn.execute(UPSERT_SQL, row).rowcount
+        count += 1
+    return count, changed
+
+
+def copy_rows(conn, rows, batch_size=IMPORT_BATCH_SIZE):
+    conn.execute(text("""
+        CREATE TEMP TABLE characters_staging (
+            seq BIGINT,
+            name TEXT,
+            anime TEXT,
+            character_url TEXT,
+            gender TEXT,
+            status TEXT,
+            image_url TEXT,
+            image_path TEXT,
+            scraped_at TIMESTAMP
+        ) ON COMMIT DROP;
+    """))
+
+    columns = ", ".join(("seq",) + CHARACTER_COLUMNS)
+    cursor = conn.connection.cursor()
     count = 0
+    animes = {}
+    try:
+        for batch in batched(rows, batch_size):
+            buf = io.StringIO()
+            for row in batch:
+                values = [str(count)] + [_copy_value(row[c]) for c in CHARACTER_COLUMNS]
+                buf.write("\t".join(values) + "\n")
+                if row["anime"] and row["anime"] not in animes:
+                    animes[row["anime"]] = row["character_url"]
+                count += 1
+            buf.seek(0)
+            cursor.copy_expert(f"COPY characters_staging ({columns}) FROM STDIN", buf)
+    finally:
+        cursor.close()
+
+    upsert_animes(conn, animes)
+    changed = conn.execute(MERGE_STAGING_SQL).rowcount if count else 0
+    return count, changed
+
+
+def import_json(engine, mode=IMPORT_MODE, path=JSON_PATH):
+    if not os.path.exists(path):
+        print(f"[IMPORT] Fichier introuvable : {path}")
+        return 0
+
+    # Les items sont lus en flux et envoyés directement à l'écriture par lots
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f, engine.begin() as conn:
+        rows = iter_rows(iter_items(f, path))
+        if mode == "row":
+            count, changed = insert_rows(conn, rows)
+        else:
+            count, changed = copy_rows(conn, rows)
+    elapsed = time.perf_counter() - start
+
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"[IMPORT] {count} personnages importés en {elapsed:.2f}s "
+          f"({rate:.0f} lignes/s, mode={mode}), {changed} lignes modifiées.")
+    return changed
+
+
+def refresh_stats(engine):
+    # Recalcule character_stats : un parcours séquentiel de characters et un
+    # GROUP BY, coût linéaire en nombre de personnages (durée affichée dans le
+    # log). CONCURRENTLY laisse le dashboard lire l'ancienne version pendant
+    # le calcul.
+    start = time.perf_counter()
     with engine.begin() as conn:
-        for it in items:
-            name = it.get("name")
-            if not name or not it.get("character_url"):
-                continue
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY character_stats;"))
+    print(f"[IMPORT] character_stats rafraîchie en {time.perf_counter() - start:.2f}s.")
 
 
-            if name.startswith("List of"):
-                continue
+def bump_data_version(engine):
+    # Invalide les caches du webapp (voir queries.get_data_version)
+    with engine.begin() as conn:
+        version = conn.execute(text("""
+            INSERT INTO dataset_version (id, version, updated_at) VALUES (1, 1, now())
+            ON CONFLICT (id) DO UPDATE SET
+                version = dataset_version.version + 1,
+                updated_at = now()
+            RETURNING version
+        """)).scalar()
+    print(f"[IMPORT] Version des données : {version}.")
+
+
+def export_snapshot(engine):
+    if not SNAPSHOT_PATH:
+        return
+    # Un échec ne remet pas l'import en cause : les pages gardent l'ancien snapshot
+    try:
+        import snapshot
+        snapshot.export(engine, SNAPSHOT_PATH)
+    except Exception as e:
+        print(f"[SNAPSHOT] Export en échec : {e}")
 
-            conn.execute(sql, {
-                "name": name,
-                "anime": it.get("anime"),
-                "character_url": it.get("character_url"),
-                "gender": normalize_gender(it.get("gender")),
-                "status": normalize_status(it.get("status")),
-                "image_url": it.get("image_url"),
-            })
-            count += 1
 
-    print(f"[IMPORT] {count} personnages importés.")
+def publish(engine):
+    # Après un import qui a modifié des lignes
+    refresh_stats(engine)
+    bump_data_version(engine)
+    export_snapshot(engine)
+
+
+# -----------------------------
+# Mode worker : crawl + import planifiés, par wiki
+# -----------------------------
+def list_wikis():
+    # Les wikis et le nom d'anime viennent du spider lui-même
+    if str(SCRAPY_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRAPY_DIR))
+    from crawler.spiders.characters_spider import CharactersSpider
+
+    return {CharactersSpider.anime_name(url): url for url in CharactersSpider.start_urls}
+
+
+def _wiki_slug(anime):
+    return anime.replace(" ", "-")
+
+
+def _wiki_feed(anime):
+    return JSON_PATH.with_name(f"{JSON_PATH.stem}.{_wiki_slug(anime)}{JSON_PATH.suffix}")
+
+
+def due_jobs(engine, wikis, interval=REFRESH_INTERVAL, retry=RETRY_DELAY):
+    # Un wiki est à recrawler s'il ne l'a jamais été, si son dernier succès
+    # date de plus de `interval` secondes, ou si son dernier échec date de plus
+    # de `retry` secondes
+    with engine.begin() as conn:
+        for anime, url in wikis.items():
+            conn.execute(text("""
+                INSERT INTO crawl_jobs (anime, start_url) VALUES (:anime, :url)
+                ON CONFLICT (anime) DO UPDATE SET start_url = EXCLUDED.start_url
+            """), {"anime": anime, "url": url})
+        rows = conn.execute(text("""
+            SELECT anime FROM crawl_jobs
+            WHERE anime = ANY(:animes)
+              AND (status IN ('pending', 'queued')
+                   OR (status = 'success' AND last_success_at < now() - make_interval(secs => :interval))
+                   OR (status = 'failed' AND finished_at < now() - make_interval(secs => :retry)))
+            ORDER BY last_success_at NULLS FIRST
+        """), {"animes": list(wikis), "interval": interval, "retry": retry})
+        return [r.anime for r in rows]
+
+
+def _set_job(engine, anime, sql, **params):
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE crawl_jobs SET {sql} WHERE anime = :anime"),
+                     dict(params, anime=anime))
+
+
+def run_jobs(engine, wikis, animes):
+    # Un process scrapy par wiki, CRAWL_SHARDS en parallèle. Chaque wiki est
+    # importé dans sa propre transaction dès la fin de son crawl : un échec
+    # laisse en base les données du dernier succès.
+    # Un wiki reste 'queued' jusqu'au lancement de son process.
+    jobs = []
+    for anime in animes:
+        _set_job(engine, anime, "status = 'queued', error = NULL")
+        # Télémétrie : un fichier par wiki, les process tournent en parallèle
+        cmd = ["scrapy", "crawl", SPIDER_NAME, "-a", f"start_urls={wikis[anime]}",
+               "-s", f"TELEMETRY_NAME={_wiki_slug(anime)}"]
+        jobs.append((anime, cmd + _feed_args(_wiki_feed(anime))))
+
+    def started(anime):
+        _set_job(engine, anime, "status = 'running', started_at = now()")
+
+    for anime, returncode in run_parallel(jobs, max(CRAWL_SHARDS, 1), on_start=started):
+        if returncode != 0:
+            print(f"[WORKER] {anime} : crawl en échec (code {returncode}).")
+            _set_job(engine, anime, "status = 'failed', finished_at = now(), error = :error",
+                     error=f"scrapy code {returncode}")
+            continue
+
+        try:
+            changed = None if STREAM_TO_DB else import_json(engine, path=_wiki_feed(anime))
+            if changed:
+                publish(engine)
+            if STREAM_TO_DB or _wiki_feed(anime).exists():
+                commit_crawl(_wiki_feed(anime))
+        except Exception as e:
+            print(f"[WORKER] {anime} : import en échec ({e}).")
+            _set_job(engine, anime, "status = 'failed', finished_at = now(), error = :error",
+                     error=str(e))
+            continue
+
+        _set_job(engine, anime, "status = 'success', finished_at = now(), "
+                 "last_success_at = now(), changed = :changed", changed=changed)
+        print(f"[WORKER] {anime} : OK.")
+
+
+def run_worker(engine, interval=REFRESH_INTERVAL):
+    # Boucle indépendante du webapp (service worker de docker-compose)
+    with engine.begin() as conn:
+        # Jobs interrompus par un arrêt du worker
+        conn.execute(text("""
+            UPDATE crawl_jobs SET status = 'failed', finished_at = now(), error = 'interrompu'
+            WHERE status = 'running'
+        """))
+        empty = conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM characters)")).scalar()
+
+    # Base vide : le flux déjà présent sert de premier jeu de données
+    if empty and import_json(engine):
+        publish(engine)
+
+    wikis = list_wikis()
+    while True:
+        animes = due_jobs(engine, wikis, interval)
+        print(f"[WORKER] {len(animes)} wikis à rafraîchir.")
+        if animes:
+            run_jobs(engine, wikis, animes)
+        time.sleep(WORKER_POLL)
 
 
 # -----------------------------
@@ -134,11 +875,37 @@ def main():
     engine = create_engine(DB_URL)
     init_db(engine)
 
-    if RUN_SCRAPY_ON_START:
-        run_scrapy()
+    feeds = run_scrapy() if RUN_SCRAPY_ON_START else [JSON_PATH]
+
+    # Chaque flux est importé dès qu'il est prêt ; rien à rafraîchir si aucun
+    # import n'a modifié de ligne
+    changed = 0
+    for feed in feeds:
+        changed += import_json(engine, path=feed)
+        if os.path.exists(feed):
+            commit_crawl(feed)
 
-    import_json(engine)
+    if changed:
+        publish(engine)
+    elif SNAPSHOT_PATH and not os.path.exists(SNAPSHOT_PATH):
+        export_snapshot(engine)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Crawl et import des personnages")
+    parser.add_argument("--worker", action="store_true",
+                        help="crawl + import planifiés par wiki, en boucle")
+    parser.add_argument("--init-only", action="store_true",
+                        help="crée ou met à jour le schéma, sans import")
+    args = parser.parse_args()
+
+    if args.worker or args.init_only:
+        engine = create_engine(DB_URL)
+        init_db(engine)
+        # Premier démarrage avec DATA_SOURCE=snapshot : base déjà remplie
+        if SNAPSHOT_PATH and not os.path.exists(SNAPSHOT_PATH):
+            export_snapshot(engine)
+        if args.worker:
+            run_worker(engine)
+    else:
+        main()
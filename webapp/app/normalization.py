@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Normalisation du genre et du statut, partagée par l'import et le dashboard.
+# Les règles s'appliquent sur une valeur ; pour une colonne entière on ne les
+# applique qu'une fois par valeur distincte (table de correspondance), puis on
+# produit une colonne category.
+
+GENDERS = ("Male", "Female", "Unknown")
+STATUSES = ("Alive", "Deceased", "Unknown")
+
+GENDER_DTYPE = pd.CategoricalDtype(GENDERS)
+STATUS_DTYPE = pd.CategoricalDtype(STATUSES)
+
+# Règles par ordre de priorité : (motif en minuscules, valeur canonique)
+GENDER_RULES = (
+    ("♀", "Female"),
+    ("♂", "Male"),
+    ("female", "Female"),
+    ("male", "Male"),
+)
+STATUS_RULES = (
+    ("alive", "Alive"),
+    ("deceased", "Deceased"),
+)
+
+
+def _apply_rules(value, rules):
+    if not isinstance(value, str) or not value.strip():
+        return "Unknown"
+
+    v = value.strip().lower()
+    for pattern, canonical in rules:
+        if pattern in v:
+            return canonical
+    return "Unknown"
+
+
+# Peu de valeurs distinctes : le cache évite de réappliquer les règles à
+# chaque ligne importée. Seules les chaînes y passent : une liste ou un dict
+# mal formé dans le flux (non hashable) donne "Unknown" au lieu d'une erreur.
+@lru_cache(maxsize=4096)
+def _cached_gender(gender: str) -> str:
+    return _apply_rules(gender, GENDER_RULES)
+
+
+@lru_cache(maxsize=4096)
+def _cached_status(status: str) -> str:
+    return _apply_rules(status, STATUS_RULES)
+
+
+def normalize_gender(gender) -> str:
+    return _cached_gender(gender) if isinstance(gender, str) else "Unknown"
+
+
+def normalize_status(status) -> str:
+    return _cached_status(status) if isinstance(status, str) else "Unknown"
+
+
+def _normalize_series(series, normalize, dtype):
+    # Les règles ne tournent que sur les valeurs distinctes, le résultat est
+    # redistribué sur toutes les lignes par leurs codes (-1 = valeur manquante)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    lookup = np.array([normalize(u) for u in uniques] + [normalize(None)], dtype=object)
+    return pd.Series(
+        pd.Categorical(lookup[codes], dtype=dtype),
+        index=series.index,
+        name=series.name,
+    )
+
+
+def normalize_gender_series(series):
+    return _normalize_series(series, normalize_gender, GENDER_DTYPE)
+
+
+def normalize_status_series(series):
+    return _normalize_series(series, normalize_status, STATUS_DTYPE)
+
+
+def _is_canonical(series, values):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        present = series.cat.categories
+    else:
+        present = series.dropna().unique()
+    return not series.isna().any() and set(present) <= set(values)
+
+
+def canonicalize(df):
+    # L'import stocke déjà des valeurs canoniques : dans ce cas on se contente
+    # de convertir en category, sans réappliquer les règles
+    df = df.copy()
+    for column, values, dtype, normalize in (
+        ("gender", GENDERS, GENDER_DTYPE, normalize_gender_series),
+        ("status", STATUSES, STATUS_DTYPE, normalize_status_series),
+    ):
+        if column not in df:
+            continue
+        if _is_canonical(df[column], values):
+            df[column] = df[column].astype(dtype)
+        else:
+            df[column] = normalize(df[column])
+    if "anime" in df:
+        df["anime"] = df["anime"].astype("category")
+    return df
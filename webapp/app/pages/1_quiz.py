@@ -1,41 +1,26 @@
-import os
-import pandas as pd
 import streamlit as st
-import requests
-from PIL import Image
-from io import BytesIO
-from sqlalchemy import create_engine, text
 
-st.title("Quiz personnalité")
-
-DB_URL = os.environ.get("DATABASE_URL")
-if not DB_URL:
-    st.error("DATABASE_URL manquante. Lance via docker-compose.")
-    st.stop()
+import profiling
+from db import connect, data_version, missing_config, source
+from images import get_thumbnail
+from profiling import stage
 
-engine = create_engine(DB_URL)
+QUIZ_IMAGE_WIDTH = 512
 
-@st.cache_data(ttl=10)
-def load_df():
-    with engine.connect() as conn:
+st.title("Quiz personnalité")
 
-        return pd.read_sql(
-            text("SELECT * FROM characters ORDER BY id DESC"),
-            conn
-        )
+error = missing_config()
+if error:
+    st.error(error)
+    st.stop()
 
-@st.cache_data(ttl=3600)
-def fetch_image(url: str):
-    if not isinstance(url, str) or not url.startswith("http"):
-        return None
-    try:
-        r = requests.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
-        return Image.open(BytesIO(r.content))
-    except Exception:
-        return None
+profiling.start()
 
-df = load_df()
+# Recherche ponctuelle par nom (idx_characters_name) au lieu de charger la table
+@profiling.cache_data(max_entries=64)
+def load_character(names, version):
+    with connect() as conn:
+        return source.find_first_character(conn, names)
 
 st.write("Réponds aux questions pour découvrir quel personnage tu es ;)")
 
@@ -173,14 +158,30 @@ if st.button("Découvrir mon personnage"):
     if character_name is None:
         character_name = fallback_by_axis.get(top_axes[0])
 
-    row = df[df["name"] == character_name]
-    r = row.iloc[0]
+    # Le personnage visé peut manquer (wiki non crawlé, comme Haikyuu pour
+    # Daichi Sawamura) : on essaie alors les personnages de repli des deux
+    # axes dominants, puis les autres
+    candidates = [
+        character_name,
+        fallback_by_axis.get(top_axes[0]),
+        fallback_by_axis.get(top_axes[1]),
+        *fallback_by_axis.values(),
+    ]
+    candidates = tuple(dict.fromkeys(c for c in candidates if c))
+
+    r = load_character(candidates, data_version())
+    if r is None:
+        st.warning("Aucun personnage du quiz n'est encore dans la base, relance l'import.")
+        st.stop()
 
     st.success(f"Tu es : {r['name']}")
 
-    img = fetch_image(r.get("image_url", ""))
-    if img is not None:
-        st.image(img, use_column_width=True)
+    with stage("image"):
+        img = get_thumbnail(r.get("image_url", ""), QUIZ_IMAGE_WIDTH, r.get("image_path"))
+        if img is not None:
+            st.image(img, use_column_width=True)
 
     st.write("Anime :", r.get("anime"))
     st.markdown(f"[Voir la page Fandom]({r.get('character_url')})")
+
+profiling.report("quiz")
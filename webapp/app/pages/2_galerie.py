@@ -1,62 +1,69 @@
-import os
-import pandas as pd
+import random
+
 import streamlit as st
-from sqlalchemy import create_engine, text
 
-import requests
-from PIL import Image
-from io import BytesIO
+import profiling
+from db import connect, data_version, missing_config, source
+from images import iter_thumbnails, prefetch_thumbnails
+from profiling import stage
+
+# Largeur utile de la page (layout "centered") répartie entre les colonnes
+GALLERY_WIDTH = 704
 
 st.title("Galerie")
 
-DB_URL = os.environ.get("DATABASE_URL")
-if not DB_URL:
-    st.error("DATABASE_URL manquante. Lance via docker-compose.")
+error = missing_config()
+if error:
+    st.error(error)
     st.stop()
 
-engine = create_engine(DB_URL)
-
-@st.cache_data(ttl=10)
-def load_df():
-    with engine.connect() as conn:
-        return pd.read_sql(text("SELECT * FROM characters ORDER BY id DESC"), conn)
+profiling.start()
 
-df = load_df()
-
-@st.cache_data(ttl=3600)
-def fetch_image(url: str):
-    if not isinstance(url, str) or not url.startswith("http"):
-        return None
-    try:
-        r = requests.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
-        return Image.open(BytesIO(r.content))
-    except Exception:
-        return None
+# Tirage aléatoire côté PostgreSQL : seules les lignes affichées sont chargées
+@profiling.cache_data(max_entries=64)
+def load_sample(limit, seed, version):
+    with connect() as conn:
+        return source.sample_with_images(conn, limit, seed)
 
 st.subheader("Galerie de portraits")
 
 cols = st.slider("Colonnes", 2, 6, 4)
 limit = st.slider("Nombre d'images", 8, 60, 24)
 
-gallery_df = df.copy()
-gallery_df = gallery_df[
-    gallery_df["image_url"].notna()
-    & gallery_df["image_url"].astype(str).str.startswith("http")
-]
+if "gallery_seed" not in st.session_state:
+    st.session_state.gallery_seed = random.randrange(1_000_000)
+if st.button("Mélanger"):
+    st.session_state.gallery_seed += 1
+
+version = data_version()
+gallery_df = load_sample(limit, st.session_state.gallery_seed, version)
 
-gallery_df = gallery_df.sample(frac=1, random_state=None).head(limit)
+width = GALLERY_WIDTH // cols
 
+# Chaque tuile a un emplacement réservé, rempli dès que son image arrive
 grid = st.columns(cols)
+slots = []
 for i, (_, r) in enumerate(gallery_df.iterrows()):
     with grid[i % cols]:
-        img = fetch_image(r.get("image_url", ""))
-        if img is not None:
-            st.image(img, use_column_width=True)
-        else:
-            st.caption("Image indisponible")
+        slots.append(st.empty())
 
         st.markdown(f"**{r.get('name','')}**")
         url = r.get("character_url", "")
         if isinstance(url, str) and url.startswith("http"):
             st.markdown(f"[page descriptive]({url})")
+
+with stage("images"):
+    for i, img in iter_thumbnails(
+        gallery_df["image_url"].tolist(), width, gallery_df["image_path"].tolist()
+    ):
+        if img is not None:
+            slots[i].image(img, use_column_width=True)
+        else:
+            slots[i].caption("Image indisponible")
+
+# Précharge le tirage suivant (bouton "Mélanger") pendant que l'utilisateur regarde
+with stage("prefetch"):
+    next_df = load_sample(limit, st.session_state.gallery_seed + 1, version)
+    prefetch_thumbnails(next_df["image_url"].tolist(), width, next_df["image_path"].tolist())
+
+profiling.report("galerie")
@@ -0,0 +1,136 @@
+import contextlib
+import functools
+import os
+import threading
+import time
+
+import streamlit as st
+
+import db
+
+# Profilage du rendu des pages Streamlit, activé avec APP_PROFILE=1.
+#
+# - stage("nom") : chronomètre une étape du script (SQL, normalisation,
+#   graphiques, images...). Les étapes peuvent s'imbriquer.
+# - cache_data(...) : remplace @st.cache_data et compte, par rendu, les
+#   appels servis par le cache (hit) et ceux qui exécutent la fonction (miss).
+# - report(page) : à la fin du script, affiche les étapes, le cache et le
+#   temps passé en base (db.py) dans la sidebar et dans le log.
+#
+# Désactivé, stage() renvoie un contexte vide partagé et cache_data() est
+# exactement st.cache_data : le coût est négligeable.
+
+APP_PROFILE = os.environ.get("APP_PROFILE", "0") == "1"
+
+# Chaque session Streamlit exécute son script dans son propre thread
+_local = threading.local()
+_NOOP = contextlib.nullcontext()
+
+# Totaux depuis le démarrage du process, toutes sessions confondues
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def start():
+    # Début d'un rendu : remet à zéro les étapes, le cache et les temps DB
+    db.start_timings()
+    _local.start = time.perf_counter()
+    _local.stages = []
+    _local.depth = 0
+    _local.cache = {}
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        # Ajoutée à l'entrée pour garder l'ordre du script (parent avant enfants)
+        self.depth = getattr(_local, "depth", 0)
+        _local.depth = self.depth + 1
+        self.entry = [self.depth, self.name, 0.0]
+        stages = getattr(_local, "stages", None)
+        if stages is not None:
+            stages.append(self.entry)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.entry[2] = time.perf_counter() - self.start
+        _local.depth = self.depth
+        return False
+
+
+def stage(name):
+    if not APP_PROFILE:
+        return _NOOP
+    return _Stage(name)
+
+
+def _count(name, key):
+    cache = getattr(_local, "cache", None)
+    if cache is not None:
+        counts = cache.setdefault(name, {"hit": 0, "miss": 0})
+        counts[key] += 1
+    with _totals_lock:
+        counts = _totals.setdefault(name, {"hit": 0, "miss": 0})
+        counts[key] += 1
+
+
+def cache_data(**kwargs):
+    def decorate(fn):
+        if not APP_PROFILE:
+            return st.cache_data(**kwargs)(fn)
+
+        name = fn.__name__
+        misses = threading.local()
+
+        # Le corps n'est exécuté qu'en cas de miss
+        @functools.wraps(fn)
+        def body(*args, **kw):
+            misses.flag = True
+            return fn(*args, **kw)
+
+        cached = st.cache_data(**kwargs)(body)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            misses.flag = False
+            with _Stage(name):
+                result = cached(*args, **kw)
+            _count(name, "miss" if misses.flag else "hit")
+            return result
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorate
+
+
+def report(page):
+    # Appelée en fin de script, après la dernière étape
+    if not APP_PROFILE:
+        db.show_timings(page)
+        return
+
+    total_ms = (time.perf_counter() - getattr(_local, "start", time.perf_counter())) * 1000
+    stages = getattr(_local, "stages", [])
+    cache = getattr(_local, "cache", {})
+    db_rows = db.timings()
+    db_ms = sum(t for _, t in db_rows) * 1000
+
+    top = " | ".join(f"{name} {s * 1000:.1f}" for depth, name, s in stages if depth == 0)
+    hits = ", ".join(f"{n} {c['hit']} hit/{c['miss']} miss" for n, c in cache.items())
+    print(f"[PROFILE] {page} : {total_ms:.1f} ms | {top} | DB {db_ms:.1f} ms "
+          f"({len(db_rows)} requêtes) | cache : {hits}")
+
+    with st.sidebar.expander(f"Profil : {total_ms:.0f} ms"):
+        for depth, name, seconds in stages:
+            st.caption(f"{'↳ ' * depth}{name} : {seconds * 1000:.1f} ms")
+        st.caption(f"Base : {db_ms:.1f} ms, {len(db_rows)} requêtes")
+        for name, counts in cache.items():
+            with _totals_lock:
+                total = dict(_totals.get(name, {}))
+            st.caption(f"cache {name} : {counts['hit']} hit / {counts['miss']} miss "
+                       f"(process : {total.get('hit', 0)} / {total.get('miss', 0)})")
+
+    db.show_timings(page)
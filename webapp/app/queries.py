@@ -0,0 +1,243 @@
+import pandas as pd
+from sqlalchemy import text
+
+# Couche de requêtes du dashboard : les filtres (anime, recherche), la
+# pagination et les agrégats sont calculés par PostgreSQL, qui s'appuie sur
+# idx_characters_anime_status / idx_characters_anime_gender / idx_characters_name.
+# Une page ne transfère que les lignes qu'elle affiche.
+#
+# characters ne garde que anime_id (dimension animes) et des enums pour le
+# genre et le statut : les lignes renvoyées portent le nom affiché de l'anime
+# et des valeurs en texte, comme avant la normalisation du schéma.
+
+CHARACTER_FIELDS = """
+    c.id, c.name, a.name AS anime, c.gender::text AS gender, c.status::text AS status,
+    c.character_url, c.image_url, c.image_path
+"""
+
+CHARACTERS_JOIN = "characters c LEFT JOIN animes a ON a.id = c.anime_id"
+
+# Colonnes à faible cardinalité chargées directement en category
+CATEGORY_DTYPES = {"anime": "category", "gender": "category", "status": "category"}
+
+# Colonnes autorisées pour les agrégats (interpolées dans le SQL) et leur enum
+GROUP_COLUMNS = {"gender": "character_gender", "status": "character_status"}
+
+# Filtre par nom d'anime : les ids sont résolus une fois (InitPlan), puis
+# lus par les index (anime_id, ...) ; un IN (sous-requête) devient une
+# jointure moins bien estimée
+ANIME_CLAUSE = "c.anime_id = ANY(ARRAY(SELECT id FROM animes WHERE name = ANY(:animes)))"
+# Même filtre sur la vue character_stats, qui porte directement le nom
+STATS_ANIME_CLAUSE = "anime = ANY(:animes)"
+
+
+# Recherche plein texte : search_text (nom, anime, genre, statut en
+# minuscules) est indexé par un GIN pg_trgm (idx_characters_search_trgm).
+# Le LIKE trouve les sous-chaînes et préfixes, <% tolère les fautes de frappe
+# (word_similarity >= pg_trgm.word_similarity_threshold, 0.6 par défaut).
+# Cible : < 50 ms par recherche sur 100k personnages.
+SEARCH_CLAUSE = "(c.search_text LIKE :q_like OR :q <% c.search_text)"
+
+# Classement : préfixe du nom d'abord, puis similarité, puis les plus récents
+SEARCH_ORDER = """
+    (lower(c.name) LIKE :q_prefix) DESC,
+    word_similarity(:q, c.search_text) DESC,
+    c.id DESC
+"""
+
+
+def _search_params(q):
+    ql = q.strip().lower()
+    return {
+        "q": ql,
+        "q_like": f"%{_escape_like(ql)}%",
+        "q_prefix": f"{_escape_like(ql)}%",
+    }
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _where(animes=None, q="", extra=None, anime_clause=ANIME_CLAUSE):
+    clauses, params = [], {}
+    if animes:
+        clauses.append(anime_clause)
+        params["animes"] = list(animes)
+    if q and q.strip():
+        clauses.append(SEARCH_CLAUSE)
+        params.update(_search_params(q))
+    if extra:
+        clauses.append(extra)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+# -----------------------------
+# Version des données
+# -----------------------------
+# Incrémentée par import_characters.py quand un import modifie des lignes.
+# Les pages l'ajoutent à la clé de leurs caches : une nouvelle version
+# invalide les résultats en cache, sans recharger tant qu'elle ne change pas.
+def get_data_version(conn):
+    version = conn.execute(text("SELECT version FROM dataset_version WHERE id = 1")).scalar()
+    return version or 0
+
+
+# -----------------------------
+# Listes et compteurs
+# -----------------------------
+def list_animes(conn):
+    # Une sonde d'index par anime au lieu d'un DISTINCT sur toute la table
+    rows = conn.execute(text("""
+        SELECT a.name FROM animes a
+        WHERE EXISTS (SELECT 1 FROM characters c WHERE c.anime_id = a.id)
+        ORDER BY a.name
+    """))
+    return [r[0] for r in rows]
+
+
+def count_characters(conn, animes=None, q=""):
+    where, params = _where(animes, q)
+    return conn.execute(text(f"SELECT count(*) FROM characters c {where}"), params).scalar()
+
+
+def count_animes(conn):
+    return conn.execute(text("""
+        SELECT count(*) FROM animes a
+        WHERE EXISTS (SELECT 1 FROM characters c WHERE c.anime_id = a.id)
+    """)).scalar()
+
+
+# -----------------------------
+# Lignes
+# -----------------------------
+def load_page(conn, animes=None, q="", limit=100, offset=0):
+    # Avec une recherche, les résultats sont classés par pertinence
+    where, params = _where(animes, q)
+    params.update(limit=limit, offset=offset)
+    order = SEARCH_ORDER if q and q.strip() else "c.id DESC"
+    return pd.read_sql(text(f"""
+        SELECT {CHARACTER_FIELDS} FROM {CHARACTERS_JOIN} {where}
+        ORDER BY {order}
+        LIMIT :limit OFFSET :offset
+    """), conn, params=params, dtype=CATEGORY_DTYPES)
+
+
+def sample_with_images(conn, limit, seed=0, offset=0):
+    # Mélange déterministe pour une graine donnée : la même graine redonne le
+    # même ordre, ce qui permet de paginer (offset) dans un tirage.
+    return pd.read_sql(text(f"""
+        SELECT {CHARACTER_FIELDS} FROM {CHARACTERS_JOIN}
+        WHERE c.image_path IS NOT NULL OR c.image_url LIKE 'http%'
+        ORDER BY md5(c.id::text || ':' || CAST(:seed AS text))
+        LIMIT :limit OFFSET :offset
+    """), conn, params={"limit": limit, "seed": seed, "offset": offset}, dtype=CATEGORY_DTYPES)
+
+
+def find_first_character(conn, names):
+    # Un seul aller-retour indexé (idx_characters_name) pour une liste de noms
+    # par ordre de préférence : renvoie le premier présent en base
+    rows = conn.execute(text(f"""
+        SELECT DISTINCT ON (c.name) {CHARACTER_FIELDS} FROM {CHARACTERS_JOIN}
+        WHERE c.name = ANY(:names)
+        ORDER BY c.name, c.id DESC
+    """), {"names": list(names)}).mappings().all()
+    by_name = {r["name"]: dict(r) for r in rows}
+    for name in names:
+        if name in by_name:
+            return by_name[name]
+    return None
+
+
+# -----------------------------
+# Agrégats pour les graphiques
+# -----------------------------
+def count_by_anime(conn, animes=None, q="", top=15):
+    where, params = _where(animes, q)
+    params["top"] = top
+    # Regroupement sur anime_id (index), le nom n'est joint qu'aux `top` lignes
+    return pd.read_sql(text(f"""
+        SELECT COALESCE(a.name, 'Unknown') AS anime, g.count
+        FROM (
+            SELECT c.anime_id, count(*) AS count
+            FROM characters c {where}
+            GROUP BY c.anime_id
+            ORDER BY count DESC
+            LIMIT :top
+        ) g
+        LEFT JOIN animes a ON a.id = g.anime_id
+        ORDER BY g.count DESC
+    """), conn, params=params)
+
+
+def count_by_anime_and(conn, column, values, animes=None, q="", top=15):
+    # Nombre de personnages par (anime, valeur de column), limité aux `top`
+    # animes qui ont le plus de personnages parmi `values`
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"Colonne non autorisée : {column}")
+
+    extra = f"c.{column} = ANY(CAST(:values AS {GROUP_COLUMNS[column]}[]))"
+    where, params = _where(animes, q, extra=extra)
+    params.update(values=list(values), top=top)
+    # Regroupement sur (anime_id, column), couvert par l'index composite
+    return pd.read_sql(text(f"""
+        WITH grouped AS (
+            SELECT c.anime_id, c.{column}, count(*) AS count
+            FROM characters c {where}
+            GROUP BY c.anime_id, c.{column}
+        ),
+        top_animes AS (
+            SELECT anime_id FROM grouped
+            GROUP BY anime_id
+            ORDER BY sum(count) DESC
+            LIMIT :top
+        )
+        SELECT COALESCE(a.name, 'Unknown') AS anime, g.{column}::text AS {column}, g.count
+        FROM grouped g
+        JOIN top_animes t ON t.anime_id IS NOT DISTINCT FROM g.anime_id
+        LEFT JOIN animes a ON a.id = g.anime_id
+    """), conn, params=params)
+
+
+# -----------------------------
+# Agrégats précalculés (vue matérialisée character_stats)
+# -----------------------------
+# Quelques centaines de lignes (anime, gender, status, count), rafraîchies par
+# import_characters.main() après chaque import. Elles ne servent que sans
+# recherche texte : avec une recherche, les agrégats sont calculés en direct.
+def stats_by_anime(conn, animes=None, top=15):
+    where, params = _where(animes, anime_clause=STATS_ANIME_CLAUSE)
+    params["top"] = top
+    return pd.read_sql(text(f"""
+        SELECT anime, sum(count)::bigint AS count
+        FROM character_stats {where}
+        GROUP BY anime
+        ORDER BY count DESC
+        LIMIT :top
+    """), conn, params=params)
+
+
+def stats_by_anime_and(conn, column, values, animes=None, top=15):
+    if column not in GROUP_COLUMNS:
+        raise ValueError(f"Colonne non autorisée : {column}")
+
+    where, params = _where(animes, extra=f"{column} = ANY(:values)",
+                           anime_clause=STATS_ANIME_CLAUSE)
+    params.update(values=list(values), top=top)
+    return pd.read_sql(text(f"""
+        WITH filtered AS (
+            SELECT anime, {column}, sum(count)::bigint AS count
+            FROM character_stats {where}
+            GROUP BY anime, {column}
+        ),
+        top_animes AS (
+            SELECT anime FROM filtered
+            GROUP BY anime
+            ORDER BY sum(count) DESC
+            LIMIT :top
+        )
+        SELECT f.anime, f.{column}, f.count
+        FROM filtered f
+        JOIN top_animes USING (anime)
+    """), conn, params=params)
@@ -0,0 +1,228 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+
+# Snapshot colonnaire de la table characters (Arrow IPC, non compressé),
+# écrit par import_characters.py après chaque import qui modifie des lignes.
+#
+# Avec DATA_SOURCE=snapshot, les pages lisent ce fichier au lieu d'interroger
+# PostgreSQL (voir db.connect) : il est mappé en mémoire, sans copie ni
+# décodage, et les pages du cache système sont partagées entre les process
+# Streamlit. anime, gender et status sont encodés en dictionnaire (un code
+# par ligne) et arrivent dans pandas en category.
+#
+# Les fonctions de lecture ont la même signature que celles de queries.py,
+# avec la table Arrow à la place de la connexion. Différence : la recherche
+# ne trouve que les sous-chaînes (pas de tolérance aux fautes, pg_trgm).
+
+SNAPSHOT_BATCH_SIZE = 50_000
+
+# Même ordre que les pages du dashboard (id DESC) : la première page est une
+# simple tranche de la table
+EXPORT_SQL = """
+    SELECT c.id, c.name, a.name AS anime, CAST(c.gender AS TEXT) AS gender,
+           CAST(c.status AS TEXT) AS status, c.character_url, c.image_url, c.image_path,
+           c.search_text
+    FROM characters c
+    LEFT JOIN animes a ON a.id = c.anime_id
+    ORDER BY c.id DESC
+"""
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("name", pa.string()),
+    ("anime", pa.string()),
+    ("gender", pa.string()),
+    ("status", pa.string()),
+    ("character_url", pa.string()),
+    ("image_url", pa.string()),
+    ("image_path", pa.string()),
+    ("search_text", pa.string()),
+])
+
+DICTIONARY_COLUMNS = ("anime", "gender", "status")
+# Codes sur 2 octets par ligne (quelques centaines de valeurs au plus)
+DICTIONARY_TYPE = pa.dictionary(pa.int16(), pa.string())
+
+# Colonnes renvoyées aux pages (CHARACTER_FIELDS de queries.py)
+CHARACTER_FIELDS = ["id", "name", "anime", "gender", "status", "character_url", "image_url", "image_path"]
+
+
+# -----------------------------
+# Écriture (import_characters.py)
+# -----------------------------
+def export(engine, path):
+    # Lecture en flux (curseur serveur) par lots de SNAPSHOT_BATCH_SIZE lignes
+    start = time.perf_counter()
+    batches = []
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).exec_driver_sql(EXPORT_SQL)
+        for rows in result.partitions(SNAPSHOT_BATCH_SIZE):
+            columns = list(zip(*rows))
+            batches.append(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, SCHEMA)],
+                schema=SCHEMA,
+            ))
+
+    # Un seul bloc par colonne, donc un seul dictionnaire par colonne encodée
+    table = pa.Table.from_batches(batches, schema=SCHEMA).combine_chunks()
+    for name in DICTIONARY_COLUMNS:
+        i = table.schema.get_field_index(name)
+        table = table.set_column(i, name, table[name].dictionary_encode().cast(DICTIONARY_TYPE))
+
+    # Écriture atomique : un lecteur garde l'ancien fichier mappé jusqu'à son
+    # prochain rechargement. Fichier temporaire unique : le web et le worker
+    # (ou deux imports de wikis) peuvent exporter en même temps.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    print(f"[SNAPSHOT] {table.num_rows} personnages exportés en "
+          f"{time.perf_counter() - start:.2f}s ({path.stat().st_size / 1e6:.1f} Mo) : {path}")
+    return table.num_rows
+
+
+# -----------------------------
+# Lecture (pages Streamlit)
+# -----------------------------
+def version(path):
+    # Date de modification : change à chaque export
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def open_table(path):
+    # Les colonnes pointent directement dans le fichier mappé
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _mask(table, animes=None, q="", extra=None):
+    masks = []
+    if animes:
+        masks.append(pc.is_in(table["anime"], value_set=pa.array(list(animes), pa.string())))
+    if q and q.strip():
+        masks.append(pc.match_substring(table["search_text"], q.strip().lower()))
+    if extra is not None:
+        masks.append(extra)
+    if not masks:
+        return None
+    mask = masks[0]
+    for m in masks[1:]:
+        mask = pc.and_kleene(mask, m)
+    return mask
+
+
+def _filter(table, animes=None, q="", extra=None):
+    mask = _mask(table, animes, q, extra)
+    return table if mask is None else table.filter(mask)
+
+
+def _to_pandas(table):
+    return table.select(CHARACTER_FIELDS).to_pandas()
+
+
+# -----------------------------
+# Listes et compteurs
+# -----------------------------
+def list_animes(table):
+    animes = pc.unique(table["anime"]).to_pylist()
+    return sorted(a for a in animes if a and a.strip())
+
+
+def count_characters(table, animes=None, q=""):
+    return _filter(table, animes, q).num_rows
+
+
+def count_animes(table):
+    return len(pc.unique(table["anime"]).drop_null())
+
+
+# -----------------------------
+# Lignes
+# -----------------------------
+def load_page(table, animes=None, q="", limit=100, offset=0):
+    rows = _filter(table, animes, q)
+    if q and q.strip():
+        # Préfixe du nom d'abord, puis les plus récents (l'ordre de la table)
+        prefix = pc.starts_with(pc.utf8_lower(rows["name"]), q.strip().lower())
+        order = pc.sort_indices(
+            pa.table({"prefix": prefix, "id": rows["id"]}),
+            sort_keys=[("prefix", "descending"), ("id", "descending")],
+        )
+        rows = rows.take(order)
+    return _to_pandas(rows.slice(offset, limit))
+
+
+def sample_with_images(table, limit, seed=0, offset=0):
+    # Mélange déterministe pour une graine donnée, comme la version SQL
+    has_image = pc.or_kleene(
+        pc.is_valid(table["image_path"]),
+        pc.fill_null(pc.starts_with(table["image_url"], "http"), False),
+    )
+    rows = table.filter(has_image)
+    order = np.random.default_rng(seed).permutation(rows.num_rows)
+    return _to_pandas(rows.take(order[offset:offset + limit]))
+
+
+def find_first_character(table, names):
+    # Table triée par id DESC : la première ligne d'un nom est la plus récente
+    rows = table.filter(pc.is_in(table["name"], value_set=pa.array(list(names), pa.string())))
+    by_name = {}
+    for r in rows.select(CHARACTER_FIELDS).to_pylist():
+        by_name.setdefault(r["name"], r)
+    for name in names:
+        if name in by_name:
+            return by_name[name]
+    return None
+
+
+# -----------------------------
+# Agrégats pour les graphiques
+# -----------------------------
+def _group_counts(table, keys):
+    df = table.group_by(keys).aggregate([("id", "count")]).to_pandas()
+    df = df.rename(columns={"id_count": "count"})
+    for key in keys:
+        df[key] = df[key].astype(object)
+    df["anime"] = df["anime"].fillna("Unknown")
+    return df[list(keys) + ["count"]]
+
+
+def count_by_anime(table, animes=None, q="", top=15):
+    df = _group_counts(_filter(table, animes, q), ["anime"])
+    return df.sort_values("count", ascending=False).head(top).reset_index(drop=True)
+
+
+def count_by_anime_and(table, column, values, animes=None, q="", top=15):
+    if column not in ("gender", "status"):
+        raise ValueError(f"Colonne non autorisée : {column}")
+
+    extra = pc.is_in(table[column], value_set=pa.array(list(values), pa.string()))
+    df = _group_counts(_filter(table, animes, q, extra), ["anime", column])
+    top_animes = df.groupby("anime")["count"].sum().nlargest(top).index
+    return df[df["anime"].isin(top_animes)].reset_index(drop=True)
+
+
+# Pas de vue character_stats ici : les agrégats sont calculés sur le snapshot
+def stats_by_anime(table, animes=None, top=15):
+    return count_by_anime(table, animes, top=top)
+
+
+def stats_by_anime_and(table, column, values, animes=None, top=15):
+    return count_by_anime_and(table, column, values, animes, top=top)